@@ -6,11 +6,27 @@ import mimetypes
 from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.http import MediaInMemoryUpload
-from data_ingestion.config import DRIVE_FOLDER_ID
+from googleapiclient.http import MediaInMemoryUpload, MediaFileUpload
+from data_ingestion.config import DRIVE_FOLDER_ID, DRIVE_UPLOAD_CHUNK
 
-def upload_to_google_drive(file_path, file_content, gc):
-    """Upload a file to Google Drive and return its shareable link."""
+def _find_uploaded(drive_client, dedupe_key):
+    """Return the id and link of a file in DRIVE_FOLDER_ID tagged with dedupe_key, or None."""
+    escaped = dedupe_key.replace("\\", "\\\\").replace("'", "\\'")
+    query = (f"'{DRIVE_FOLDER_ID}' in parents and trashed = false and "
+             f"appProperties has {{ key='dedupe_key' and value='{escaped}' }}")
+    files = drive_client.files().list(q=query, fields='files(id,webViewLink)', pageSize=1).execute().get('files', [])
+    return files[0] if files else None
+
+def upload_to_google_drive(file_path, file_content, gc, local_path=None, raise_errors=False, dedupe_key=None):
+    """Upload a file to Google Drive and return its shareable link.
+
+    With local_path the file is streamed from disk in resumable chunks
+    instead of being passed in memory as file_content. With dedupe_key the
+    file is tagged with the key, and a file uploaded earlier with the same
+    key (e.g. by an attempt that failed before finishing) is reused instead
+    of uploading a copy. Returns None if the upload fails, or raises if
+    raise_errors is set.
+    """
     try:
         SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
         creds = None
@@ -34,18 +50,32 @@ def upload_to_google_drive(file_path, file_content, gc):
             'name': file_name,
             'parents': [DRIVE_FOLDER_ID]
         }
+        if dedupe_key:
+            file_metadata['appProperties'] = {'dedupe_key': dedupe_key}
 
-        media = MediaInMemoryUpload(
-            file_content,
-            mimetype=mimetypes.guess_type(file_name)[0],
-            resumable=True
-        )
+        file = _find_uploaded(drive_client, dedupe_key) if dedupe_key else None
+        if file:
+            print(f"♻️ Reusing earlier Google Drive upload of {file_name} (ID: {file.get('id')})")
+        else:
+            if local_path:
+                media = MediaFileUpload(
+                    local_path,
+                    mimetype=mimetypes.guess_type(file_name)[0],
+                    chunksize=DRIVE_UPLOAD_CHUNK,
+                    resumable=True
+                )
+            else:
+                media = MediaInMemoryUpload(
+                    file_content,
+                    mimetype=mimetypes.guess_type(file_name)[0],
+                    resumable=True
+                )
 
-        file = drive_client.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id,webViewLink'
-        ).execute()
+            file = drive_client.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id,webViewLink'
+            ).execute()
 
         file_id = file.get('id')
         file_link = file.get('webViewLink')
@@ -62,6 +92,8 @@ def upload_to_google_drive(file_path, file_content, gc):
 
     except Exception as e:
         print(f"❌ Error uploading to Google Drive: {e}")
+        if raise_errors:
+            raise
         import traceback
         print(traceback.format_exc())
         return None
\ No newline at end of file
@@ -61,8 +61,12 @@ def is_file_in_sheet(gc, spreadsheet_id, file_name):
         return False
 
 
-def write_to_google_sheet(parsed_data, spreadsheet_id):
-    """Write parsed resume data to Google Sheets."""
+def write_to_google_sheet(parsed_data, spreadsheet_id, raise_errors=False):
+    """Write parsed resume data to Google Sheets; return the row it was written to, or False.
+
+    False means the file was already in the sheet or, unless raise_errors is
+    set, that the write failed; with raise_errors a failure raises instead.
+    """
     try:
         gc = get_google_sheets_client()
         file_name = parsed_data.get("File Name", "Unknown")
@@ -87,6 +91,7 @@ def write_to_google_sheet(parsed_data, spreadsheet_id):
 
         if not all_values:
             print("DEBUG - Sheet is empty, setting headers")
+            headers = full_headers
             worksheet.update('A1', [full_headers])
             print(f"DEBUG - Headers set to: {full_headers}")
             worksheet.format('A1:Z1', {"textFormat": {"bold": True}})
@@ -121,10 +126,12 @@ def write_to_google_sheet(parsed_data, spreadsheet_id):
 
         worksheet.update(f'A{row_to_insert}', [row_data])
         print(f"✅ Added {file_name} to Google Sheet at row {row_to_insert}")
-        return True
+        return row_to_insert
 
     except Exception as e:
         print(f"❌ Error writing to Google Sheet: {e}")
+        if raise_errors:
+            raise
         import traceback
         print(traceback.format_exc())
         return False
\ No newline at end of file
@@ -1,10 +1,14 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 import os
-import time
-import shutil
+import json
+import asyncio
+import queue
+import threading
 from werkzeug.utils import secure_filename
-from data_ingestion.file_processor import process_single_resume, extract_text_from_pdf, extract_text_from_docx, parse_resume
-from data_ingestion.config import SAVE_DIR, SPREADSHEET_ID
+from data_ingestion.file_processor import process_single_resume, extract_resume_text, parse_resume_async
+from data_ingestion.config import SAVE_DIR, SPREADSHEET_ID, OCR_PRELOAD, EXTRACTION_CHAR_BUDGET
+from data_ingestion.ocr_engine import init_ocr_engine
+from data_ingestion.utils import write_file_async
 from Google_work.google_sheet import write_to_google_sheet, get_google_sheets_client
 from Google_work.google_drive import upload_to_google_drive
 from datetime import datetime
@@ -17,111 +21,96 @@ ALLOWED_EXTENSIONS = {'pdf', 'docx', 'doc', 'rtf', 'txt', 'png', 'jpg'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max file size
 
+# Background writes of uploads to TEMP_STORAGE_FOLDER, awaited by /save;
+# entries remove themselves once the write finishes
+pending_writes = {}
+
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 if not os.path.exists(TEMP_STORAGE_FOLDER):
     os.makedirs(TEMP_STORAGE_FOLDER)
 
+# Load the OCR models once in the master so forked workers share them
+if OCR_PRELOAD:
+    init_ocr_engine()
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def estimate_tokens(text: str) -> int:
-    """Estimate the number of tokens in a text string."""
-    char_count = len(text)
-    estimated_tokens = int(char_count / 4.5)
-    estimated_tokens = int(estimated_tokens * 1.2)
-    print(f"Estimated tokens for text (length {char_count} chars): {estimated_tokens}")
-    return estimated_tokens
-
-def truncate_text(text: str, max_tokens: int) -> str:
-    """Truncate text to fit within the max_tokens limit."""
-    chars_per_token = 4.5
-    max_chars = int(max_tokens * chars_per_token / 1.2)
-    if len(text) <= max_chars:
-        return text
-    truncated_text = text[:max_chars]
-    print(f"Truncated text from {len(text)} to {max_chars} characters to fit within {max_tokens} tokens")
-    return truncated_text
+def save_upload_async(filename, file_content):
+    """Write an upload to TEMP_STORAGE_FOLDER in the background, tracked in pending_writes until done."""
+    future = write_file_async(os.path.join(TEMP_STORAGE_FOLDER, filename), file_content)
+    pending_writes[filename] = future
+
+    def forget(done):
+        if pending_writes.get(filename) is done:
+            pending_writes.pop(filename, None)
+
+    future.add_done_callback(forget)
+    return future
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/upload', methods=['POST'])
-def upload_files():
-    if 'resumes' not in request.files:
-        return jsonify({'error': 'No files uploaded'}), 400
-    
+@app.route('/upload/stream', methods=['POST'])
+def upload_files_stream():
+    """Parse uploaded resumes, streaming NDJSON events so fields can be shown as soon as they are parsed.
+
+    Emits {"index", "field", "value"} per field, {"index", "resume"} per file
+    and a final {"file_references"} line.
+    """
     files = request.files.getlist('resumes')
+    if len(files) == 0:
+        return jsonify({'error': 'No valid files selected'}), 400
     if len(files) > 10:
         return jsonify({'error': 'Maximum 10 resumes allowed'}), 400
 
-    if len(files) == 0:
-        return jsonify({'error': 'No valid files selected'}), 400
+    uploads = []
+    for file in files:
+        filename = secure_filename(file.filename) if file and allowed_file(file.filename) else None
+        file_content = file.read() if filename else None
+        if filename:
+            save_upload_async(filename, file_content)
+        uploads.append((file.filename, filename, file_content))
+
+    events = queue.Queue()
+
+    async def parse_one(idx, original_name, filename, file_content):
+        if not filename:
+            events.put({'index': idx, 'resume': {'original_filename': original_name, 'error': 'Unsupported file type'}})
+            return
+        try:
+            resume_text = await asyncio.to_thread(extract_resume_text, filename, file_content,
+                                                  max_chars=EXTRACTION_CHAR_BUDGET)
+            parsed_data = await parse_resume_async(resume_text, file_name=filename,
+                                                   on_field=lambda key, value: events.put({'index': idx, 'field': key, 'value': value}))
+            if 'error' not in parsed_data:
+                parsed_data['Date'] = datetime.now().strftime("%d/%m/%Y")
+        except Exception as e:
+            print(f"Error processing {filename}: {e}")
+            parsed_data = {'error': str(e)}
+        parsed_data['original_filename'] = filename
+        events.put({'index': idx, 'resume': parsed_data})
 
-    parsed_resumes = []
-    max_retries = 3
-    retry_delay = 60
-    max_tokens = 5500
+    async def parse_uploads():
+        await asyncio.gather(*(parse_one(idx, *upload) for idx, upload in enumerate(uploads)))
 
-    file_references = {}
+    def parse_all():
+        # All files are parsed concurrently on one event loop
+        asyncio.run(parse_uploads())
+        events.put({'file_references': {filename: filename for _, filename, _ in uploads if filename}})
 
-    for file in files:
-        if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            temp_file_path = os.path.join(TEMP_STORAGE_FOLDER, filename)
-            file.save(file_path)
-
-            # Copy the file to the temp storage folder
-            shutil.copy(file_path, temp_file_path)
-
-            # Store the filename as a reference
-            file_references[filename] = filename
-
-            # Extract text based on file type
-            for attempt in range(max_retries):
-                try:
-                    if filename.lower().endswith('.pdf'):
-                        resume_text = extract_text_from_pdf(file_path)
-                    else:
-                        resume_text = extract_text_from_docx(file_path, advanced_mode=False)
+    threading.Thread(target=parse_all, daemon=True).start()
 
-                    estimated_tokens = estimate_tokens(resume_text)
-                    if estimated_tokens > max_tokens:
-                        print(f"Resume text for {filename} exceeds {max_tokens} tokens, truncating")
-                        resume_text = truncate_text(resume_text, max_tokens)
+    def generate():
+        while True:
+            event = events.get()
+            yield json.dumps(event, default=str) + "\n"
+            if 'file_references' in event:
+                break
 
-                    parsed_data = parse_resume(resume_text, filename)
-                    if 'error' in parsed_data:
-                        parsed_data['original_filename'] = filename
-                        parsed_resumes.append(parsed_data)
-                    else:
-                        parsed_data['Date'] = datetime.now().strftime("%d/%m/%Y")
-                        parsed_data['original_filename'] = filename  # Add original_filename for successful parses
-                        parsed_resumes.append(parsed_data)
-                    break
-                except Exception as e:
-                    if "rate_limit_exceeded" in str(e) and attempt < max_retries - 1:
-                        print(f"Rate limit exceeded for {filename}, retrying in {retry_delay} seconds (attempt {attempt + 1}/{max_retries})")
-                        time.sleep(retry_delay)
-                    else:
-                        print(f"Error processing {filename}: {e}")
-                        parsed_resumes.append({
-                            'original_filename': filename,
-                            'error': str(e)
-                        })
-                        break
-                finally:
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-        else:
-            parsed_resumes.append({
-                'original_filename': file.filename,
-                'error': 'Unsupported file type'
-            })
-
-    return jsonify({'resumes': parsed_resumes, 'file_references': file_references})
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @app.route('/save', methods=['POST'])
 def save_to_sheet():
@@ -148,6 +137,9 @@ def save_to_sheet():
                 if filename in file_references:
                     # Retrieve the file from the temp storage folder
                     temp_file_path = os.path.join(TEMP_STORAGE_FOLDER, filename)
+                    pending_write = pending_writes.pop(filename, None)
+                    if pending_write:
+                        pending_write.result()
                     if os.path.exists(temp_file_path):
                         with open(temp_file_path, 'rb') as f:
                             file_content = f.read()
@@ -180,6 +172,9 @@ def save_to_sheet():
 
     # Clean up any remaining temporary files
     for filename in file_references:
+        pending_write = pending_writes.pop(filename, None)
+        if pending_write:
+            pending_write.result()
         temp_file_path = os.path.join(TEMP_STORAGE_FOLDER, filename)
         if os.path.exists(temp_file_path):
             os.remove(temp_file_path)
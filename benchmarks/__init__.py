@@ -0,0 +1 @@
+"""Marks the directory as a Python package."""
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""Benchmark the streaming DOCX extractor against the python-docx implementation.
+
+Usage: python -m benchmarks.docx_extraction [corpus_dir] [repeats]
+"""
+
+import glob
+import os
+import sys
+import time
+import tracemalloc
+from data_ingestion.docx_stream import extract_docx_stream
+from data_ingestion.file_processor import _extract_text_from_docx_legacy
+
+
+def _measure(extract, path, repeats):
+    """Return (best seconds per call, peak traced bytes) for an extractor."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        extract(path)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    extract(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    """Run both extractors over every .docx in the corpus and print a summary."""
+    corpus_dir = sys.argv[1] if len(sys.argv) > 1 else "uploads"
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    paths = sorted(glob.glob(os.path.join(corpus_dir, "*.docx")))
+    if not paths:
+        print(f"No .docx files found in {corpus_dir}")
+        return
+
+    extractors = {
+        "python-docx": lambda path: _extract_text_from_docx_legacy(path, path, advanced_mode=True),
+        "stream": lambda path: extract_docx_stream(path, advanced_mode=True),
+    }
+    totals = {name: [0.0, 0] for name in extractors}
+
+    print(f"{'file':40} {'python-docx ms':>15} {'stream ms':>10} {'peak KB (old/new)':>20}")
+    for path in paths:
+        results = {name: _measure(extract, path, repeats) for name, extract in extractors.items()}
+        for name, (seconds, peak) in results.items():
+            totals[name][0] += seconds
+            totals[name][1] = max(totals[name][1], peak)
+        old, new = results["python-docx"], results["stream"]
+        print(f"{os.path.basename(path)[:40]:40} {old[0] * 1000:15.1f} {new[0] * 1000:10.1f} "
+              f"{old[1] // 1024:>9}/{new[1] // 1024:<10}")
+
+    old_total, new_total = totals["python-docx"][0], totals["stream"][0]
+    print(f"\n{len(paths)} file(s): python-docx {old_total * 1000:.1f} ms, stream {new_total * 1000:.1f} ms "
+          f"({old_total / new_total if new_total else float('inf'):.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Content-addressed on-disk caches for extraction and parsing results."""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_bytes(data) -> str:
+    """Return the SHA-256 hex digest of a bytes-like object."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(file_path: str) -> str:
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """A size-bounded JSON cache on disk with LRU eviction.
+
+    Each entry is stored as ``<key>.json`` together with the cache version
+    and its creation time. Entries written under another version, or older
+    than ``ttl`` seconds, are treated as misses and removed. Reads bump the
+    file's mtime, and writes evict the least recently used entries until the
+    directory fits in ``max_bytes``.
+
+    Sizes and recency are tracked in memory, so a write only touches its own
+    entry. The directory is scanned once at startup and again whenever the
+    running total goes over the limit, which also picks up entries written
+    by other processes sharing the directory.
+    """
+
+    def __init__(self, directory, max_bytes, version, ttl=None):
+        """Initialize the cache in the given directory."""
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = version
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # path -> size in bytes, least recently used first
+        self._index = OrderedDict()
+        self._total = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        expired = self.ttl is not None and time.time() - entry.get("created", 0) > self.ttl
+        if entry.get("version") != self.version or expired:
+            self._remove(path)
+            with self._lock:
+                self._forget(path)
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            if path in self._index:
+                self._index.move_to_end(path)
+        self.hits += 1
+        return entry.get("value")
+
+    def put(self, key, value):
+        """Store a JSON-serialisable value under key and enforce the size bound."""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        entry = {"version": self.version, "created": time.time(), "value": value}
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry {key}: {e}")
+            self._remove(tmp_path)
+            return
+        with self._lock:
+            self._forget(path)
+            self._index[path] = size
+            self._total += size
+        self._evict()
+
+    def stats(self):
+        """Return hit/miss counters for this cache."""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _forget(self, path):
+        """Drop path from the in-memory index (caller holds the lock)."""
+        self._total -= self._index.pop(path, 0)
+
+    def _scan(self):
+        """Rebuild the in-memory index from the files in the directory, oldest first."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        with self._lock:
+            self._index = OrderedDict((path, size) for _, size, path in sorted(entries))
+            self._total = sum(self._index.values())
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        if self._total <= self.max_bytes:
+            return
+        # Other processes may have added or evicted entries since the last scan
+        self._scan()
+        with self._lock:
+            while self._total > self.max_bytes and self._index:
+                path, size = self._index.popitem(last=False)
+                self._total -= size
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -19,12 +19,95 @@ else:
     PASSWORD="Om@LogBinary" # GoDaddy password
     IMAP_SERVER="imap.secureserver.net"
 
+# Mailboxes swept for resumes; add an entry per extra account (e.g. hr@ or the Gmail inbox)
+ACCOUNTS = [
+    {"email": EMAIL, "password": PASSWORD, "imap_server": IMAP_SERVER},
+]
+IMAP_POOL_SIZE = 3  # connections kept open per account during a sweep
+SWEEP_MAX_WORKERS = 4  # folders swept at once across all accounts (each sweep runs its own pipeline)
+
 SPREADSHEET_ID = "1moOssMtT96cifsWtDLpXRae_7v0yMtjwDBRCgJtyzPM"
 DRIVE_FOLDER_ID = "1U1xy6XZ3GncGBaYNiKmWTn-aDc9pxBIx"
+DRIVE_UPLOAD_CHUNK = 4 * 1024 * 1024  # bytes per resumable upload request (a multiple of 256 KiB)
 # File system settings
 SAVE_DIR = "hr_mail_testing"
+SAVE_ATTACHMENTS = True  # keep a copy of each attachment in SAVE_DIR (written in the background)
 os.makedirs(SAVE_DIR, exist_ok=True)
 
+# OCR settings
+OCR_LANGUAGES = ['en']
+OCR_USE_GPU = False
+OCR_DPI = 200
+OCR_GRAYSCALE = True  # render single-channel pages, a third of the memory of RGB
+OCR_MODE = os.getenv("OCR_MODE", "serial")  # "serial" or "process"
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", min(4, os.cpu_count() or 1)))
+OCR_DOC_TIMEOUT = 300  # seconds allowed for all OCR pages of one document
+OCR_MIN_PAGE_CHARS = 20  # pages with fewer extractable characters are sent to OCR
+OCR_PRELOAD = os.getenv("OCR_PRELOAD", "0") == "1"  # warm the reader at import time (gunicorn --preload)
+
+# Extraction cache settings
+EXTRACTION_CACHE_DIR = os.path.join(".cache", "extracted_text")
+EXTRACTION_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Parse cache settings
+PARSE_CACHE_DIR = os.path.join(".cache", "parsed_resumes")
+PARSE_CACHE_MAX_BYTES = 50 * 1024 * 1024
+PARSE_CACHE_TTL = 7 * 24 * 3600  # seconds; "Present" roles change Total Experience over time
+
+# Prompt budget settings
+RESUME_TOKEN_BUDGET = 5500  # resume tokens sent to the LLM after section-aware packing
+EXTRACTION_CHAR_BUDGET = 40000  # stop extracting/OCR-ing once this much text is collected
+BATCH_TOKEN_BUDGET = 6000  # resume tokens packed into one batched parse request
+BATCH_MAX_SIZE = 5  # resumes per batched parse request
+# tiktoken BPE files are only read from this cache, never downloaded at run time;
+# fill it once with: TIKTOKEN_CACHE_DIR=tokenizer_cache python -c "import tiktoken; tiktoken.get_encoding('cl100k_base')"
+TOKENIZER_CACHE_DIR = os.getenv("TIKTOKEN_CACHE_DIR", "tokenizer_cache")
+
+# Fields found by data_ingestion/pre_extractor.py are not requested from the LLM;
+# skills only count as known once at least this many dictionary skills matched
+PRE_EXTRACT_MIN_SKILLS = 8
+
+# Ask the model for a JSON object via the provider's response_format (falls back to
+# plain streaming if the model rejects it)
+PARSE_JSON_MODE = os.getenv("PARSE_JSON_MODE", "1") == "1"
+
+# Fields that must be filled for a parse to be usable; if the model leaves any empty,
+# only those are re-requested using the matching resume sections (capped at this many tokens)
+REPAIR_FIELDS = ["Name", "Total Experience", "Skills"]
+REPAIR_TOKEN_BUDGET = 1500
+
+# Email ingestion pipeline (data_ingestion/pipeline.py)
+PIPELINE_QUEUE_SIZE = 8  # emails waiting in front of a stage before the stage feeding it blocks
+PIPELINE_EXTRACT_WORKERS = OCR_MAX_WORKERS  # processes extracting/OCR-ing attachments
+PIPELINE_PARSE_CONCURRENCY = 8  # emails parsed at once (the Groq client limits requests further)
+PIPELINE_UPLOAD_WORKERS = 4  # threads uploading attachments to Google Drive
+PIPELINE_STATS_INTERVAL = 30  # seconds between per-stage progress lines, 0 to disable
+PROCESS_START_METHOD = os.getenv("PROCESS_START_METHOD", "spawn")  # worker pools start from threads, where fork is unsafe
+
+# IMAP fetching (data_ingestion/imap_fetch.py)
+IMAP_FETCH_BATCH = 50  # messages per batched UID FETCH
+IMAP_PREFETCH_BATCHES = 2  # fetched batches waiting while the current one is processed
+IMAP_FETCH_CHUNK = 1024 * 1024  # bytes of an attachment fetched (and held in memory) at a time
+
+# Folders swept after the inbox (those missing on the server are skipped)
+IMAP_SUBFOLDERS = ["Junk", "INBOX/Important", "INBOX/Unsorted", "INBOX/JobApplications",
+                   "INBOX/Naukri.com", "INBOX/Unnecessary", "Drafts"]
+
+# Daemon mode (python main.py --daemon): one IMAP connection per watched folder
+IMAP_IDLE_TIMEOUT = 600  # seconds per IDLE before re-issuing it (servers drop IDLE after 29 minutes)
+IMAP_POLL_MIN_INTERVAL = 5  # NOOP polling when the server has no IDLE: start here, back off while idle...
+IMAP_POLL_MAX_INTERVAL = 120  # ...up to this many seconds
+IMAP_RECONNECT_MIN_DELAY = 5  # seconds before reconnecting a dropped connection, doubled per failure...
+IMAP_RECONNECT_MAX_DELAY = 300  # ...up to this
+
+# Durable ingestion job queue (data_ingestion/job_queue.py)
+JOB_QUEUE_PATH = "ingestion_jobs.sqlite3"
+JOB_SPOOL_DIR = "job_spool"  # attachment bytes of unfinished jobs, removed once a job completes
+JOB_VISIBILITY_TIMEOUT = 1800  # seconds a claimed job stays invisible to other workers
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 60  # seconds before a failed job can be claimed again
+LEDGER_CLAIM_GRACE = 600  # seconds a pending ledger claim may wait for its job before it counts as orphaned
+
 # Groq API keys
 API_KEYS = [
     "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",  # testing
@@ -36,4 +119,6 @@ API_KEYS = [
     "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",  # clg
     "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",  # sen TenZ
     "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",  # unknown
-]
\ No newline at end of file
+]
+# Concurrent async Groq requests allowed per distinct API key
+GROQ_REQUESTS_PER_KEY = 2
@@ -0,0 +1,117 @@
+"""SQLite ledger of ingested attachments, keyed by content hash and candidate email."""
+
+import email.utils
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attachments (
+    sha256 TEXT NOT NULL,
+    email TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    folder TEXT,
+    filename TEXT,
+    status TEXT NOT NULL DEFAULT 'done',
+    sheet_ref TEXT,
+    PRIMARY KEY (sha256, email)
+) WITHOUT ROWID;
+"""
+# Columns added after the first version of the table; rows from before were all written to the sheet
+_ADDED_COLUMNS = {
+    "status": "TEXT NOT NULL DEFAULT 'done'",
+    "sheet_ref": "TEXT",
+}
+
+
+def normalize_email(address):
+    """Return the bare, lower-case address of a From header, without a +tag; "" if there is none."""
+    _, addr = email.utils.parseaddr(address or "")
+    local, _, domain = addr.strip().lower().partition("@")
+    if not domain:
+        return local
+    return f"{local.split('+', 1)[0]}@{domain}"
+
+
+class DedupLedger:
+    """Attachments already taken in, one row per (SHA-256 of the bytes, normalised sender email).
+
+    The same resume sent again by the same candidate is dropped whatever it
+    is called, while different candidates' Resume.pdf files are kept apart.
+    An attachment is claimed as pending when its job is queued and marked
+    done once it is in the sheet; a claim whose job fails is released so a
+    resend is accepted.
+    """
+
+    def __init__(self, path):
+        """Open (creating if needed) the ledger database at path."""
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(attachments)")}
+        for name, definition in _ADDED_COLUMNS.items():
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE attachments ADD COLUMN {name} {definition}")
+
+    def get(self, sha256, sender):
+        """Return the ledger entry for an attachment as a dict (pending or done), or None if it was never seen."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM attachments WHERE sha256 = ? AND email = ?", (sha256, sender)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def claim(self, sha256, sender, folder, filename, takeover=None):
+        """Record an attachment as pending; return False if it was already seen (so it is a duplicate).
+
+        takeover(entry), if given, is asked about an existing pending claim;
+        when it returns True (e.g. the claim's job was never queued) the
+        claim is taken over instead of treating the attachment as a duplicate.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO attachments (sha256, email, first_seen, folder, filename, status) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (sha256, sender, now, folder, filename, PENDING),
+            )
+            if cursor.rowcount == 1:
+                return True
+            row = self._conn.execute(
+                "SELECT * FROM attachments WHERE sha256 = ? AND email = ?", (sha256, sender)
+            ).fetchone()
+        if row is None or row["status"] != PENDING or takeover is None or not takeover(dict(row)):
+            return False
+        with self._lock:
+            # Only if nobody else took it over in the meantime
+            cursor = self._conn.execute(
+                "UPDATE attachments SET first_seen = ?, folder = ?, filename = ? "
+                "WHERE sha256 = ? AND email = ? AND status = ? AND first_seen = ?",
+                (now, folder, filename, sha256, sender, PENDING, row["first_seen"]),
+            )
+        if cursor.rowcount == 1:
+            logger.warning(f"Took over orphaned pending claim of {row['filename']} from {row['folder']}")
+        return cursor.rowcount == 1
+
+    def complete(self, sha256, sender, sheet_ref):
+        """Mark a claimed attachment as ingested; sheet_ref (its Drive link or file name) finds its sheet row."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE attachments SET status = ?, sheet_ref = ? WHERE sha256 = ? AND email = ?",
+                (DONE, sheet_ref, sha256, sender),
+            )
+
+    def release(self, sha256, sender):
+        """Forget a pending claim, so the attachment is accepted again if it is resent."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM attachments WHERE sha256 = ? AND email = ? AND status = ?", (sha256, sender, PENDING)
+            )
@@ -0,0 +1,216 @@
+"""Single-pass DOCX text extraction that streams word/document.xml with lxml."""
+
+import posixpath
+import zipfile
+import logging
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+STYLES_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"
+
+
+def _w(tag):
+    return f"{{{W_NS}}}{tag}"
+
+
+BODY, P, TBL, TR, TC = _w("body"), _w("p"), _w("tbl"), _w("tr"), _w("tc")
+R, T, TAB, BR, CR = _w("r"), _w("t"), _w("tab"), _w("br"), _w("cr")
+HYPERLINK, INS, SMART_TAG = _w("hyperlink"), _w("ins"), _w("smartTag")
+PPR, PSTYLE, RPR, B, I, VAL = _w("pPr"), _w("pStyle"), _w("rPr"), _w("b"), _w("i"), _w("val")
+STYLE, STYLE_ID, NAME, TYPE = _w("style"), _w("styleId"), _w("name"), _w("type")
+DEFAULT = _w("default")
+RUN_CONTAINERS = (HYPERLINK, INS, SMART_TAG)
+FALSE_VALUES = ("0", "false", "off")
+
+
+def _resolve_part(base_dir, target):
+    """Resolve a relationship target to a zip member name."""
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+
+def _find_rel_target(package, rels_name, rel_type, base_dir):
+    """Return the zip member a relationship of rel_type points at, if any."""
+    try:
+        rels = etree.fromstring(package.read(rels_name))
+    except KeyError:
+        return None
+    for rel in rels.iter(f"{{{REL_NS}}}Relationship"):
+        if rel.get("Type") == rel_type:
+            return _resolve_part(base_dir, rel.get("Target"))
+    return None
+
+
+def _load_style_names(package, document_part):
+    """Map paragraph style IDs to style names and return the default style name."""
+    base_dir = posixpath.dirname(document_part)
+    rels_name = posixpath.join(base_dir, "_rels", posixpath.basename(document_part) + ".rels")
+    styles_part = _find_rel_target(package, rels_name, STYLES_REL, base_dir)
+    style_names = {}
+    default_style = "Normal"
+    if not styles_part:
+        return style_names, default_style
+    try:
+        styles = etree.fromstring(package.read(styles_part))
+    except KeyError:
+        return style_names, default_style
+
+    for style in styles.iter(STYLE):
+        if style.get(TYPE) != "paragraph":
+            continue
+        name_el = style.find(NAME)
+        name = name_el.get(VAL) if name_el is not None else style.get(STYLE_ID)
+        # Built-in names are stored lowercase ("heading 1"); python-docx reports them capitalised
+        if name and name.startswith(("heading ", "caption", "header", "footer")):
+            name = name[0].upper() + name[1:]
+        style_names[style.get(STYLE_ID)] = name
+        if style.get(DEFAULT) in ("1", "true", "on"):
+            default_style = name
+    return style_names, default_style
+
+
+def _iter_runs(paragraph):
+    """Yield the runs of a paragraph, including runs inside hyperlinks and insertions."""
+    for child in paragraph:
+        if child.tag == R:
+            yield child
+        elif child.tag in RUN_CONTAINERS:
+            yield from _iter_runs(child)
+
+
+def _run_text(run):
+    """Return the text of a run the way python-docx renders it."""
+    parts = []
+    for child in run:
+        if child.tag == T:
+            parts.append(child.text or "")
+        elif child.tag == TAB:
+            parts.append("\t")
+        elif child.tag == CR or (child.tag == BR and child.get(TYPE) in (None, "textWrapping")):
+            parts.append("\n")
+    return "".join(parts)
+
+
+def _toggle(rpr, tag):
+    """Return True/False/None for a run toggle property such as bold."""
+    if rpr is None:
+        return None
+    el = rpr.find(tag)
+    if el is None:
+        return None
+    return el.get(VAL) not in FALSE_VALUES
+
+
+def _paragraph_text(paragraph):
+    return "".join(_run_text(run) for run in _iter_runs(paragraph))
+
+
+def _cell_paragraph_texts(cell):
+    return [_paragraph_text(p) for p in cell.findall(P)]
+
+
+def _paragraph_info(paragraph, text, style_names, default_style):
+    """Build the advanced-mode description of a paragraph."""
+    style_name = default_style
+    ppr = paragraph.find(PPR)
+    if ppr is not None:
+        pstyle = ppr.find(PSTYLE)
+        if pstyle is not None:
+            style_name = style_names.get(pstyle.get(VAL), pstyle.get(VAL)) or default_style
+
+    formatted_parts = []
+    for run in _iter_runs(paragraph):
+        run_text = _run_text(run)
+        if run_text.strip():
+            rpr = run.find(RPR)
+            formatted_parts.append({"text": run_text, "bold": _toggle(rpr, B), "italic": _toggle(rpr, I)})
+    return {"text": text, "formatted_parts": formatted_parts, "is_heading": style_name.startswith('Heading')}
+
+
+def extract_docx_stream(source, advanced_mode=False, max_chars=None, report=None):
+    """Extract text from a DOCX path or file-like object in one streaming pass.
+
+    Top-level paragraphs and table rows are emitted in document order and
+    each element is cleared once read, so memory stays bounded by the
+    largest table. In plain-text mode parsing stops once max_chars have been
+    collected. Returns the text (or the advanced-mode dict) and whether the
+    whole document was read.
+    """
+    if advanced_mode:
+        max_chars = None
+        result = {"full_text": "", "paragraphs": [], "tables": [], "headers": [], "ordered_content": ""}
+
+    text_parts = []
+    ordered_parts = []
+    collected = 0
+    complete = True
+
+    with zipfile.ZipFile(source) as package:
+        document_part = _find_rel_target(package, "_rels/.rels", OFFICE_DOCUMENT_REL, "") or "word/document.xml"
+        if advanced_mode:
+            style_names, default_style = _load_style_names(package, document_part)
+
+        with package.open(document_part) as document_xml:
+            for _, elem in etree.iterparse(document_xml, events=("end",), tag=(P, TBL)):
+                parent = elem.getparent()
+                if parent is None or parent.tag != BODY:
+                    continue
+
+                if elem.tag == P:
+                    text = _paragraph_text(elem)
+                    if text.strip():
+                        text_parts.append(text)
+                        collected += len(text) + 1
+                        if advanced_mode:
+                            info = _paragraph_info(elem, text, style_names, default_style)
+                            result["paragraphs"].append(info)
+                            if info["is_heading"]:
+                                result["headers"].append(text)
+                            ordered_parts.append(text + "\n")
+                else:
+                    table_data = []
+                    for row in elem.findall(TR):
+                        cells = [_cell_paragraph_texts(cell) for cell in row.findall(TC)]
+                        cell_texts = ["\n".join(paragraphs) for paragraphs in cells]
+                        row_text = " | ".join(cell_text for cell_text in cell_texts if cell_text.strip())
+                        if row_text:
+                            text_parts.append(row_text)
+                            collected += len(row_text) + 1
+                        if advanced_mode:
+                            table_data.append(cell_texts)
+                            ordered_row = [p for paragraphs in cells for p in paragraphs if p.strip()]
+                            if ordered_row:
+                                ordered_parts.append(" | ".join(ordered_row) + "\n")
+                    if advanced_mode:
+                        result["tables"].append(table_data)
+
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+                if max_chars is not None and collected >= max_chars:
+                    complete = False
+                    break
+
+    if advanced_mode:
+        result["full_text"] = "\n".join(text_parts)
+        result["ordered_content"] = "".join(ordered_parts)
+        return result, True
+
+    text = "\n".join(text_parts)
+    if not complete:
+        logger.info(f"Prompt budget of {max_chars} chars met, stopped DOCX parsing early")
+        if report is not None:
+            report["truncated"] = True
+    if max_chars is not None and len(text) > max_chars:
+        if report is not None:
+            report["truncated"] = True
+            report["chars_truncated"] = len(text) - max_chars
+        text = text[:max_chars]
+        complete = False
+    return text, complete
@@ -5,58 +5,204 @@ import email
 import os
 import time
 import email.utils
-import re
-import gc
-import json
-from data_ingestion.utils import get_last_check_time,save_last_check_time
-from datetime import datetime, timedelta
-from data_ingestion.config import EMAIL, PASSWORD, IMAP_SERVER, SAVE_DIR
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from data_ingestion.config import EMAIL, ACCOUNTS, SWEEP_MAX_WORKERS, SAVE_DIR, SAVE_ATTACHMENTS, REPAIR_FIELDS
+from data_ingestion.config import SPREADSHEET_ID, EXTRACTION_CHAR_BUDGET, PIPELINE_EXTRACT_WORKERS
+from data_ingestion.config import PIPELINE_PARSE_CONCURRENCY, PIPELINE_UPLOAD_WORKERS
+from data_ingestion.config import IMAP_SUBFOLDERS, IMAP_IDLE_TIMEOUT, IMAP_POLL_MIN_INTERVAL, IMAP_POLL_MAX_INTERVAL
+from data_ingestion.config import IMAP_RECONNECT_MIN_DELAY, IMAP_RECONNECT_MAX_DELAY
+from data_ingestion.config import JOB_QUEUE_PATH, JOB_SPOOL_DIR, JOB_VISIBILITY_TIMEOUT, JOB_MAX_ATTEMPTS, JOB_RETRY_DELAY
+from data_ingestion.config import LEDGER_CLAIM_GRACE
 from data_ingestion.utils import get_last_check_time,save_last_check_time, extract_ctc_from_body, save_email_metadata
-from Google_work.google_sheet import get_google_sheets_client
-from data_ingestion.file_processor import process_single_resume
+from Google_work.google_sheet import get_google_sheets_client, write_to_google_sheet
+from data_ingestion.file_processor import extract_resume_text, parse_resume_async, prepare_sheet_row, get_repair_stats
+from data_ingestion.file_processor import NoTextError
+from data_ingestion.pipeline import Pipeline, ProcessPool, Stage
+from data_ingestion.ocr_engine import use_serial_ocr
+from data_ingestion.job_queue import JobQueue, FAILED
+from data_ingestion.dedup_ledger import DedupLedger, PENDING, normalize_email
+from data_ingestion.imap_sync import SyncState, sync_folder, has_new_messages, compact_uid_set, move_messages
+from data_ingestion.imap_sync import find_uids_by_message_id
+from data_ingestion.imap_pool import IMAPConnectionPool, list_folders, ensure_folder
+from data_ingestion.imap_idle import supports_idle, idle, poll, clear_notifications
+from data_ingestion.imap_fetch import prefetch_messages, decode_text
+from data_ingestion.cache import sha256_bytes
 from Google_work.google_drive import upload_to_google_drive
-from data_ingestion.utils import extract_experience_from_body
+from data_ingestion.utils import extract_experience_from_body, copy_file_async
+
+job_queue = JobQueue(JOB_QUEUE_PATH, visibility_timeout=JOB_VISIBILITY_TIMEOUT,
+                     max_attempts=JOB_MAX_ATTEMPTS, retry_delay=JOB_RETRY_DELAY)
+sync_state = SyncState(JOB_QUEUE_PATH)
+dedup_ledger = DedupLedger(JOB_QUEUE_PATH)
+# One extract pool for every sweep and daemon wake-up, so each worker loads the OCR models once;
+# the workers already run in parallel, so they OCR serially instead of starting OCR pools of their own
+extract_pool = ProcessPool(PIPELINE_EXTRACT_WORKERS, initializer=use_serial_ocr)
+
+PROCESSED_FOLDER = "INBOX/Processed_Resumes"
 
 def fetch_resumes_from_email():
-    """Fetch new resumes from email and process them immediately."""
+    """Fetch new resumes from every account in ACCOUNTS and process them immediately.
+
+    Folders of all accounts are swept in parallel (up to SWEEP_MAX_WORKERS
+    at once) over a small connection pool per account, and each account's
+    folders are listed only once.
+    """
     gc = get_google_sheets_client()
     # spreadsheet_id = "1abJoq2JX3CHDu5pwH1xt6uMgADDekxxmzlW8DQIzFmI"
-    max_retries = 15
+    pools = [IMAPConnectionPool(account) for account in ACCOUNTS]
+    new_files = 0
+    try:
+        sweeps = []
+        for pool in pools:
+            try:
+                available_folders = pool.folders()
+                with pool.connection() as mail:
+                    ensure_folder(mail, PROCESSED_FOLDER, available_folders)
+            except Exception as e:
+                print(f"❌ Could not connect to {pool.name}: {e}")
+                continue
+            sweeps.append((pool, "inbox", available_folders))
+            for folder in IMAP_SUBFOLDERS:
+                if folder in available_folders:
+                    sweeps.append((pool, folder, available_folders))
+                else:
+                    print(f"⚠️ Skipping {folder} of {pool.name} (Not Found)")
+
+        with ThreadPoolExecutor(max_workers=SWEEP_MAX_WORKERS, thread_name_prefix="sweep") as executor:
+            futures = [executor.submit(_sweep_folder, *sweep) for sweep in sweeps]
+            for future in as_completed(futures):
+                new_files += future.result()
+
+        print(f"🎉 Total new resumes saved and processed: {new_files}")
+        save_last_check_time()  # Moved to utils.py if needed
+        return new_files
+    finally:
+        for pool in pools:
+            pool.close()
+
+
+def _sweep_folder(pool, folder, available_folders):
+    """Sweep one folder of an account on a pooled connection; return the number of new resumes."""
+    try:
+        with pool.connection() as mail:
+            print(f"📂 Checking {folder} of {pool.name}...")
+            status, data = mail.select(folder)
+            if status != "OK":
+                print(f"❌ Could not select {folder} of {pool.name}: {data}")
+                return 0
+            return process_emails(mail, folder, account=pool.name, available_folders=available_folders)
+    except Exception as e:
+        print(f"❌ Error sweeping {folder} of {pool.name}: {e}")
+        return 0
+
+
+def run_ingestion_daemon():
+    """Keep one IMAP connection per watched folder and process new emails as soon as they arrive.
 
-    for attempt in range(max_retries):
+    Watches the inbox and every folder of IMAP_SUBFOLDERS that exists, for
+    every account in ACCOUNTS. Each folder is swept on connect, whenever
+    IDLE (or NOOP polling, if the server has no IDLE) reports new mail, and
+    when a failed job of the folder becomes due for its retry. Runs until
+    interrupted.
+    """
+    get_google_sheets_client()
+    watched = []
+    for account in ACCOUNTS:
+        pool = IMAPConnectionPool(account, size=1)
         try:
-            with imaplib.IMAP4_SSL(IMAP_SERVER) as mail:
-                mail.login(EMAIL, PASSWORD)
-                new_files = 0
-
-                print("📂 Checking Inbox...")
-                mail.select("inbox")
-                new_files += process_emails(mail)
-
-                status, folders = mail.list()
-                available_folders = [folder.decode().split(' "/" ')[-1] for folder in folders]
-                subfolders_to_check = ["Junk",
-                                   "INBOX/Important", "INBOX/Unsorted", "INBOX/JobApplications", 
-                                   "INBOX/Naukri.com", "INBOX/Unnecessary", "Drafts"]
-
-                for folder in subfolders_to_check:
-                    if folder in available_folders:
-                        print(f"📂 Checking {folder}...")
-                        mail.select(folder)
-                        new_files += process_emails(mail)
-                    else:
-                        print(f"⚠️ Skipping {folder} (Not Found)")
+            available_folders = pool.folders()
+            with pool.connection() as mail:
+                ensure_folder(mail, PROCESSED_FOLDER, available_folders)
+        finally:
+            pool.close()
+        watched += [(account, folder, available_folders)
+                    for folder in ["inbox"] + [folder for folder in IMAP_SUBFOLDERS if folder in available_folders]]
+
+    stop = threading.Event()
+    # Every sweep runs its own pipeline, so only a few run at once
+    sweep_slots = threading.Semaphore(SWEEP_MAX_WORKERS)
+    threads = [
+        threading.Thread(target=watch_folder, args=(account, folder, available_folders, stop, sweep_slots),
+                         name=f"watch-{account['email']}-{folder}", daemon=True)
+        for account, folder, available_folders in watched
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("🛑 Stopping ingestion daemon")
+        stop.set()
+
 
-                print(f"🎉 Total new resumes saved and processed: {new_files}")
-                save_last_check_time()  # Moved to utils.py if needed
-                return new_files
+def watch_folder(account, folder, available_folders, stop, sweep_slots):
+    """Daemon worker: sweep folder whenever new mail arrives or a retry is due, reconnecting with backoff until stop is set."""
+    delay = IMAP_RECONNECT_MIN_DELAY
+    while not stop.is_set():
+        try:
+            with imaplib.IMAP4_SSL(account["imap_server"]) as mail:
+                mail.login(account["email"], account["password"])
+                status, data = mail.select(folder)
+                if status != "OK":
+                    raise imaplib.IMAP4.error(f"Could not select {folder}: {data}")
+                use_idle = supports_idle(mail)
+                print(f"👀 Watching {folder} of {account['email']} ({'IDLE' if use_idle else 'NOOP polling'})")
+                delay = IMAP_RECONNECT_MIN_DELAY
+                interval = IMAP_POLL_MIN_INTERVAL
+                new_mail = True  # sweep whatever arrived while disconnected
+                sync_key = _queue_folder(folder, account["email"])
+
+                while not stop.is_set():
+                    if new_mail:
+                        with sweep_slots:
+                            print(f"📬 New mail or due retries in {folder} of {account['email']}, sweeping...")
+                            process_emails(mail, folder, account=account["email"], available_folders=available_folders)
+                        interval = IMAP_POLL_MIN_INTERVAL
+                    clear_notifications(mail)
 
+                    # Failed jobs go back to the queue with a delay; wake up when the first is due
+                    # (but not straight away, so a job the sweep could not claim does not spin the loop)
+                    retry_at = job_queue.next_visible_at(folder=sync_key)
+                    retry_in = None if retry_at is None else max(IMAP_POLL_MIN_INTERVAL, retry_at - time.time())
+                    if use_idle:
+                        timeout = IMAP_IDLE_TIMEOUT if retry_in is None else min(IMAP_IDLE_TIMEOUT, retry_in)
+                        # A timed-out IDLE is followed by one UID SEARCH in case a notification was missed
+                        new_mail = idle(mail, timeout) or has_new_messages(mail, folder, sync_state, key=sync_key)
+                    else:
+                        stop.wait(interval if retry_in is None else min(interval, retry_in))
+                        new_mail = poll(mail)
+                        if not new_mail:
+                            interval = min(interval * 2, IMAP_POLL_MAX_INTERVAL)
+                    if retry_at is not None and time.time() >= retry_at:
+                        new_mail = True
         except Exception as e:
-            print(f"❌ Error: {e}")
-            return 0
+            if stop.is_set():
+                break
+            print(f"❌ Connection for {folder} of {account['email']} lost: {e}; reconnecting in {delay}s")
+            stop.wait(delay)
+            delay = min(delay * 2, IMAP_RECONNECT_MAX_DELAY)
+
 
-def process_emails(mail):
-    """Process emails and handle resume attachments."""
+def _queue_folder(folder, account=None):
+    """Return the name a folder is tracked under in the job queue and sync state.
+
+    Folders of the primary account (EMAIL) keep their plain name so existing
+    state stays valid; other accounts' folders are prefixed with the address.
+    """
+    return folder if not account or account == EMAIL else f"{account}/{folder}"
+
+
+def process_emails(mail, folder, account=None, available_folders=None):
+    """Process emails in the selected folder and handle resume attachments.
+
+    Every email with new attachments becomes a job in the durable job queue
+    before any work starts, and is only flagged and moved once the job has
+    finished. Jobs a previous run left unfinished in this folder are resumed
+    from the last stage they completed.
+    """
     import pytz
     
     new_files = 0
@@ -69,260 +215,452 @@ def process_emails(mail):
         last_check_time_ist = last_check_time
     
     last_check_time_utc = last_check_time_ist.astimezone(pytz.UTC)
+    # Only bounds a full resync (first run, or the folder's UIDVALIDITY changed)
     since_date = last_check_time_utc.strftime("%d-%b-%Y")
-    print(f"📅 Checking all emails since {since_date} (IST: {last_check_time_ist.strftime('%d-%b-%Y %H:%M:%S %Z')})...")
-    
-    search_cmd = f'(SINCE "{since_date}")'
-    print(f"🔍 Executing IMAP search command: {search_cmd}")
 
-    destination_folder = "INBOX/Processed_Resumes"
+    destination_folder = PROCESSED_FOLDER
+    # The IMAP folder name stays in folder; queue_folder is how the queue and sync state know it
+    queue_folder = _queue_folder(folder, account)
 
     try:
         # Check if the destination folder exists, if not create it
-        status, folder_list = mail.list()
-        if status != "OK":
-            print(f"❌ Failed to list folders: {status}")
-            return new_files
-            
-        folder_exists = False
-        for folder_info in folder_list:
-            if folder_info:
-                folder_parts = folder_info.decode().split(' "/"')
-                if len(folder_parts) > 1 and destination_folder in folder_parts[1]:
-                    folder_exists = True
-                    break
-                    
-        if not folder_exists:
-            print(f"📁 Creating folder: {destination_folder}")
-            status, create_response = mail.create(destination_folder)
-            if status != "OK":
-                print(f"❌ Failed to create folder {destination_folder}: {create_response}")
-                # Continue processing but won't be able to move emails
-            else:
-                print(f"✅ Folder {destination_folder} created successfully")
-                
+        if available_folders is None:
+            available_folders = list_folders(mail)
+        ensure_folder(mail, destination_folder, available_folders)
+
         if not os.path.exists(SAVE_DIR):
             os.makedirs(SAVE_DIR)
+        os.makedirs(JOB_SPOOL_DIR, exist_ok=True)
             
-        status, messages = mail.search(None, search_cmd)
-        if status != "OK":
-            print(f"❌ Search failed with status: {status}, response: {messages}")
-            return new_files
-            
-        if not messages[0]:
-            print(f"✅ No new emails since {since_date} (IST: {last_check_time_ist.strftime('%d-%b-%Y %H:%M:%S %Z')}).")
-            return new_files
-            
-        today = datetime.now().date()
-        yesterday = today - timedelta(days=1)
-        processed_files = {}
-        processed_files_path = os.path.join(SAVE_DIR, "processed_files.json")
-        
-        if os.path.exists(processed_files_path):
-            try:
-                with open(processed_files_path, 'r') as f:
-                    processed_files = json.load(f)
-            except:
-                print("⚠️ Could not load processed files history")
-                
-        for msg_num in messages[0].split():
-            status, msg_data = mail.fetch(msg_num, "(INTERNALDATE RFC822)")
-            if status != "OK":
-                print(f"❌ Fetch failed for message {msg_num}: {msg_data}")
-                continue
-                
-            # Flag to track if this email should be moved after processing
-            email_processed = False
-                
-            for response_part in msg_data:
-                if isinstance(response_part, tuple):
-                    email_date = None
-                    for part in response_part:
-                        if isinstance(part, bytes) and part.startswith(b'INTERNALDATE'):
-                            date_str = part.decode('utf-8')
-                            match = re.search(r'"([^"]+)"', date_str)
-                            if match:
-                                try:
-                                    date_str = match.group(1)
-                                    internal_date = email.utils.parsedate_to_datetime(date_str)
-                                    if internal_date.tzinfo is None:
-                                        internal_date = pytz.UTC.localize(internal_date)
-                                    internal_date_ist = internal_date.astimezone(ist)
-                                    email_date = internal_date_ist.strftime("%d/%m/%Y")
-                                    print(f"📅 Email received date: {email_date} (IST)")
-                                except Exception as e:
-                                    print(f"⚠️ Error parsing internal date: {e}")
-                                    
-                    msg = email.message_from_bytes(response_part[1])
-                    
-                    if not email_date and msg["date"]:
-                        try:
-                            parsed_date = email.utils.parsedate_to_datetime(msg["date"])
-                            if parsed_date.tzinfo is None:
-                                parsed_date = pytz.UTC.localize(parsed_date)
-                            parsed_date_ist = parsed_date.astimezone(ist)
-                            email_date = parsed_date_ist.strftime("%d/%m/%Y")
-                            print(f"📅 Using header date: {email_date} (IST)")
-                        except Exception as e:
-                            print(f"⚠️ Error parsing header date: {e}")
-                            
-                    if not email_date:
-                        now_ist = datetime.now(pytz.UTC).astimezone(ist)
-                        email_date = now_ist.strftime("%d/%m/%Y")
-                        print(f"⚠️ No date found, using today: {email_date} (IST)")
-                        
-                    sender = msg["from"]
-                    subject = msg["subject"]
-                    print(f"📬 Processing: {subject} from {sender}")
-                    
-                    email_body = ""
-                    html_body = ""
-                    
-                    if msg.is_multipart():
-                        for part in msg.walk():
-                            content_type = part.get_content_type()
-                            if content_type == "text/plain":
-                                try:
-                                    email_body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                                except:
-                                    try:
-                                        email_body = part.get_payload(decode=True).decode('latin-1', errors='ignore')
-                                    except:
-                                        email_body = str(part.get_payload(decode=True))
-                            elif content_type == "text/html":
-                                try:
-                                    html_body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                                except:
-                                    try:
-                                        html_body = part.get_payload(decode=True).decode('latin-1', errors='ignore')
-                                    except:
-                                        html_body = str(part.get_payload(decode=True))
-                    else:
-                        try:
-                            email_body = msg.get_payload(decode=True).decode('utf-8', errors='ignore')
-                        except:
-                            try:
-                                email_body = msg.get_payload(decode=True).decode('latin-1', errors='ignore')
-                            except:
-                                email_body = str(msg.get_payload(decode=True))
-                                
-                    if (not email_body or len(email_body) < 50) and html_body:
-                        email_body = html_body
-                        
-                    print(f"📄 Email Body:\n{email_body[:500]}...")
-                    
-                    experience_from_email = extract_experience_from_body(email_body)
-                    if experience_from_email:
-                        print(f"👨‍💼 Found experience in email body: {experience_from_email} years")
-                        
-                    ctc_info = extract_ctc_from_body(email_body)
-                    if ctc_info:
-                        print(f"💰 Found CTC in email body: {ctc_info}")
-                        
-                    saved_files = []
-                    file_links = {}
-                    attachment_processed = False
-                    
-                    attachments = [part for part in msg.walk() if part.get_content_disposition() == "attachment"]
-                    
-                    for part in attachments:
-                        filename = part.get_filename()
-                        if not filename or not filename.lower().endswith((".pdf", ".docx", ".doc")):
-                            continue
-                            
-                        if attachment_processed:
-                            print(f"⏩ Skipping attachment: {filename} (valid resume already processed for this email)")
-                            continue
-                            
-                        file_content = part.get_payload(decode=True)
-                        file_path = os.path.join(SAVE_DIR, filename)
-                        file_date = None
-                        
-                        if filename in processed_files:
-                            file_date_str = processed_files[filename]
-                            try:
-                                file_date = datetime.strptime(file_date_str, "%Y-%m-%d").date()
-                            except:
-                                file_date = None
-                                
-                        if file_date and (file_date == today or file_date == yesterday):
-                            print(f"⏩ Skipping: {filename} (already processed on {file_date.strftime('%Y-%m-%d')})")
-                            continue
-                            
-                        with open(file_path, "wb") as f:
-                            f.write(file_content)
-                            
-                        print(f"✅ Saved: {file_path}")
-                        processed_files[filename] = today.strftime("%Y-%m-%d")
-                        
-                        file_link = upload_to_google_drive(filename, file_content, gc)
-                        if file_link:
-                            file_links[filename] = file_link
-                            print(f"🔗 Generated link for {filename}: {file_link}")
-                            
-                        metadata = {"email_date": email_date}
-                        if ctc_info:
-                            metadata["ctc_from_email"] = ctc_info
-                        if file_link:
-                            metadata["drive_link"] = file_link
-                        if experience_from_email:
-                            metadata["experience_from_email"] = experience_from_email
-                            
-                        resume_data = process_single_resume(filename, file_link, email_date)
-                        print(f"ℹ️ Resume data extracted: {resume_data}")
-                        
-                        save_email_metadata(filename, metadata)
-                        saved_files.append(filename)
-                        new_files += 1
-                        
-                        # Set the flag to move this email after processing
-                        email_processed = True
-                        
-                        # Fallback: If resume_data is None but we have content (like PDF extraction), assume it's valid
-                        if resume_data is None and filename.lower().endswith(".pdf"):
-                            attachment_processed = True
-                            print(f"✅ Attachment {filename} assumed as resume (PDF with content extracted), skipping remaining attachments")
-                            break
-                            
-                        # Normal case: Check for required fields
-                        elif resume_data and all(
-                            field in resume_data and resume_data[field] not in [None, "", [], {}]
-                            for field in ['name', 'experience', 'skills']
-                        ):
-                            attachment_processed = True
-                            print(f"✅ Attachment {filename} contains all required resume data, skipping remaining attachments")
-                            break
+        uidvalidity, uids = sync_folder(mail, folder, sync_state, since_date, key=queue_folder)
             
-            # Mark the email as seen
-            mail.store(msg_num, '+FLAGS', '\\Seen')
-            
-            # If we processed an attachment for this email, move it to the destination folder
-            if email_processed:
-                try:
-                    # Copy the email to the destination folder
-                    result, data = mail.copy(msg_num, destination_folder)
-                    if result == "OK":
-                        # Mark the original email for deletion
-                        mail.store(msg_num, '+FLAGS', '\\Deleted')
-                        print(f"📁 Email moved to {destination_folder} folder and marked for deletion from inbox")
-                    else:
-                        print(f"⚠️ Failed to move email to {destination_folder} folder: {data}")
-                except Exception as e:
-                    print(f"❌ Error moving email to folder: {str(e)}")
-        
-        # Expunge deleted messages to permanently remove them
-        mail.expunge()
-        print("🗑️ Expunged deleted messages from inbox")
-        
+        pipeline = build_ingestion_pipeline()
+        pipeline.start()
         try:
-            with open(processed_files_path, 'w') as f:
-                json.dump(processed_files, f)
-        except:
-            print("⚠️ Could not save processed files history")
+            for job in job_queue.exhausted(folder=queue_folder):
+                _fail_job(_pipeline_item(job), "claim expired on the last attempt")
+            resumed = job_queue.claim(folder=queue_folder)
+            if resumed:
+                print(f"♻️ Resuming {len(resumed)} unfinished job(s) in {queue_folder}")
+            for job in resumed:
+                pipeline.submit(_pipeline_item(job))
+
+            def select(summary):
+                # Runs on the prefetch thread: decides which parts of each email are downloaded
+                resume_parts = _resume_parts(summary, queue_folder)
+                return _body_parts(summary["parts"]) + resume_parts if resume_parts else []
+
+            fetch_failed = False
+            seen_uids = []
+            spooled_paths = set()
+            # The prefetch thread fetches the next batches while this one is spooled and queued
+            for uid, summary, contents in prefetch_messages(mail, uids, select, spool_dir=JOB_SPOOL_DIR):
+                if contents is None:
+                    # Keep the sync position before this message so the next run retries it
+                    fetch_failed = True
+                    continue
+                spooled_paths.update(value["path"] for value in contents.values() if isinstance(value, dict))
+                # A missing summary means the message was expunged since the search
+                queued_job = _read_email(uid, summary, contents, ist, queue_folder, uidvalidity) if contents else None
+                if queued_job:
+                    # Blocks while the pipeline is full, so fetching never runs far ahead of processing
+                    pipeline.submit(_pipeline_item(queued_job))
+                elif summary:
+                    # Nothing to process; emails with a job are flagged once the job finishes
+                    seen_uids.append(uid)
+                # Queued jobs are durable, so the message counts as synced once it is in the queue
+                if not fetch_failed:
+                    sync_state.advance(queue_folder, uidvalidity, uid)
+            if seen_uids:
+                mail.uid('STORE', compact_uid_set(seen_uids), '+FLAGS', '\\Seen')
+            # Duplicates were spooled too; keep only the files a queued job uses
+            for path in spooled_paths:
+                _release_spool(path)
+        finally:
+            finished_jobs = pipeline.join()
+
+        for job in finished_jobs:
+            new_files += sum(1 for attachment in job["attachments"] if "parsed" in attachment)
+
+        # An attachment of each of these emails was processed, move them all to the destination folder at once
+        if finished_jobs:
+            error = "move failed"
+            try:
+                move_uids = _current_uids(mail, finished_jobs, uidvalidity)
+                moved = move_messages(mail, [uid for uid in move_uids.values() if uid], destination_folder)
+            except Exception as e:
+                print(f"❌ Error moving emails to folder: {str(e)}")
+                moved, error = False, f"move failed: {e}"
+            for job in finished_jobs:
+                if moved:
+                    _complete_job(job)
+                else:
+                    _fail_job(job, error)
+
+
+        print(f"🩹 Missing-field repairs so far: {get_repair_stats()}")
+        print(f"🗂️ Job queue: {job_queue.stats()}")
             
     except Exception as e:
         print(f"❌ Error during email processing: {str(e)}")
         import traceback
         print(traceback.format_exc())
         
-    return new_files
\ No newline at end of file
+    return new_files
+
+def _current_uids(mail, jobs, uidvalidity):
+    """Return {job_id: uid} of each finished job's email in the selected folder, or None where it cannot be found.
+
+    A job's stored UID is only trusted if it was queued under the folder's
+    current UIDVALIDITY; otherwise the email is looked up again by
+    Message-ID, and left where it is if that is missing or ambiguous.
+    """
+    uids = {}
+    for job in jobs:
+        if job.get("uidvalidity") == uidvalidity:
+            uids[job["job_id"]] = job["uid"]
+            continue
+        found = find_uids_by_message_id(mail, job["message_id"]) if job.get("message_id") else []
+        if len(found) == 1:
+            print(f"🔎 UIDVALIDITY changed, found {job['subject']!r} again as UID {found[0]}")
+            uids[job["job_id"]] = str(found[0])
+        else:
+            print(f"⚠️ UIDVALIDITY changed and {job['subject']!r} could not be found again; leaving it in place")
+            uids[job["job_id"]] = None
+    return uids
+
+
+def _resume_parts(summary, folder):
+    """Return the pdf/docx/doc attachment parts of an email that is not queued yet.
+
+    Decided from the BODYSTRUCTURE and headers alone, so emails that are
+    already queued or have no resume are never downloaded.
+    """
+    headers = summary["headers"]
+    existing = job_queue.find(_job_key(summary, folder))
+    if existing:
+        print(f"⏩ Skipping: {headers['subject']} (job {existing['id']} already {existing['status']})")
+        return []
+
+    return [part for part in summary["parts"] if _is_resume_attachment(part)]
+
+
+def _is_resume_attachment(part):
+    """Return True for a pdf/docx/doc attachment part."""
+    filename = part["filename"]
+    return part["disposition"] == "attachment" and bool(filename) and filename.lower().endswith((".pdf", ".docx", ".doc"))
+
+
+def _job_key(summary, folder):
+    """Return the idempotency key of an email's job: its Message-ID, or folder:uid without one."""
+    return (summary["headers"]["message-id"] or "").strip() or f"{folder}:{summary['uid']}"
+
+
+def _read_email(uid, summary, contents, ist, folder, uidvalidity=None):
+    """Queue the downloaded resume attachments of one email as a durable job.
+
+    contents holds the parts chosen by _resume_parts and _body_parts,
+    already fetched by prefetch_messages: the text body as bytes and each
+    attachment as a content-addressed file in JOB_SPOOL_DIR. Returns the
+    claimed job, or None if there is nothing to queue. Attachments the
+    dedup ledger has already seen from the same sender (same bytes,
+    whatever the file name) are dropped here, before any OCR, LLM or Drive
+    work. The others are recorded in the ledger under a content-hash
+    prefixed name (and copied to SAVE_DIR if SAVE_ATTACHMENTS), and their
+    email metadata is written before the job is queued.
+    """
+    import pytz
+
+    headers = summary["headers"]
+    job_key = _job_key(summary, folder)
+    sender_email = normalize_email(headers["from"])
+    resume_parts = []
+    for part in summary["parts"]:
+        if part["section"] not in contents or not _is_resume_attachment(part):
+            continue
+        spooled = contents[part["section"]]
+        seen = dedup_ledger.get(spooled["sha256"], sender_email)
+        if seen and not _is_orphaned_claim(seen):
+            first_seen = datetime.fromtimestamp(seen["first_seen"]).strftime("%Y-%m-%d")
+            print(f"⏩ Skipping: {part['filename']} (already received from {sender_email or 'this sender'} "
+                  f"in {seen['folder']} on {first_seen})")
+            continue
+        resume_parts.append((part, spooled))
+    if not resume_parts:
+        return None
+
+    email_date = None
+    if summary["internaldate"]:
+        try:
+            internal_date = email.utils.parsedate_to_datetime(summary["internaldate"])
+            if internal_date.tzinfo is None:
+                internal_date = pytz.UTC.localize(internal_date)
+            internal_date_ist = internal_date.astimezone(ist)
+            email_date = internal_date_ist.strftime("%d/%m/%Y")
+            print(f"📅 Email received date: {email_date} (IST)")
+        except Exception as e:
+            print(f"⚠️ Error parsing internal date: {e}")
+
+    if not email_date and headers["date"]:
+        try:
+            parsed_date = email.utils.parsedate_to_datetime(headers["date"])
+            if parsed_date.tzinfo is None:
+                parsed_date = pytz.UTC.localize(parsed_date)
+            parsed_date_ist = parsed_date.astimezone(ist)
+            email_date = parsed_date_ist.strftime("%d/%m/%Y")
+            print(f"📅 Using header date: {email_date} (IST)")
+        except Exception as e:
+            print(f"⚠️ Error parsing header date: {e}")
+
+    if not email_date:
+        now_ist = datetime.now(pytz.UTC).astimezone(ist)
+        email_date = now_ist.strftime("%d/%m/%Y")
+        print(f"⚠️ No date found, using today: {email_date} (IST)")
+
+    sender = headers["from"]
+    subject = headers["subject"]
+    print(f"📬 Processing: {subject} from {sender}")
+
+    text_parts = _body_parts(summary["parts"])
+    email_body = _email_body(text_parts, contents)
+    print(f"📄 Email Body:\n{email_body[:500]}...")
+
+    experience_from_email = extract_experience_from_body(email_body)
+    if experience_from_email:
+        print(f"👨‍💼 Found experience in email body: {experience_from_email} years")
+
+    ctc_info = extract_ctc_from_body(email_body)
+    if ctc_info:
+        print(f"💰 Found CTC in email body: {ctc_info}")
+
+    attachments = []
+    for part, spooled in resume_parts:
+        digest = spooled["sha256"]
+        # Prefixed with a hash of the ledger key so different candidates' Resume.pdf stay apart
+        # in SAVE_DIR and the metadata files
+        filename = f"{sha256_bytes(f'{digest}:{sender_email}'.encode())[:12]}_{part['filename']}"
+        if not dedup_ledger.claim(digest, sender_email, folder, filename, takeover=_is_orphaned_claim):
+            # Attached twice, or claimed by a parallel sweep since the lookup
+            continue
+        if SAVE_ATTACHMENTS:
+            copy_file_async(spooled["path"], os.path.join(SAVE_DIR, filename))
+
+        # Written before parsing so parse_resume picks up the CTC and experience from the email
+        metadata = {"email_date": email_date}
+        if ctc_info:
+            metadata["ctc_from_email"] = ctc_info
+        if experience_from_email:
+            metadata["experience_from_email"] = experience_from_email
+        save_email_metadata(filename, metadata)
+        attachments.append({"filename": filename, "original_filename": part["filename"], "sha256": digest,
+                            "path": spooled["path"]})
+
+    if not attachments:
+        return None
+    # The UID only names this email while the folder keeps this UIDVALIDITY
+    payload = {"uid": str(uid), "uidvalidity": uidvalidity, "message_id": (headers["message-id"] or "").strip(),
+               "email_date": email_date, "subject": subject, "sender": sender_email,
+               "attachments": attachments, "done_stages": []}
+    job_id, created = job_queue.enqueue(job_key, payload, folder=folder)
+    claimed = job_queue.claim(job_id=job_id) if created else []
+    return claimed[0] if claimed else None
+
+
+def _is_orphaned_claim(entry):
+    """Return True for a pending ledger claim whose job was never queued (the process died in between).
+
+    Claims younger than LEDGER_CLAIM_GRACE may belong to an email that is
+    being queued right now, so they are never orphaned.
+    """
+    return (entry["status"] == PENDING and entry["first_seen"] < time.time() - LEDGER_CLAIM_GRACE
+            and not job_queue.references(entry["sha256"]))
+
+
+def _body_parts(parts):
+    """Return the first inline text/plain and text/html parts of an email."""
+    found = {}
+    for part in parts:
+        if part["disposition"] == "attachment":
+            continue
+        if part["content_type"] in ("text/plain", "text/html"):
+            found.setdefault(part["content_type"], part)
+    return list(found.values())
+
+
+def _email_body(text_parts, contents):
+    """Return the plain-text body of an email, or its HTML body if the text part is missing or tiny."""
+    bodies = {part["content_type"]: decode_text(contents.get(part["section"], b""), part) for part in text_parts}
+    email_body = bodies.get("text/plain", "")
+    html_body = bodies.get("text/html", "")
+
+    if (not email_body or len(email_body) < 50) and html_body:
+        email_body = html_body
+    return email_body
+
+
+def has_required_fields(resume_data):
+    """Return True if parsed resume data has every field needed to accept the attachment."""
+    return bool(resume_data) and all(
+        field in resume_data and resume_data[field] not in [None, "", [], {}]
+        for field in REPAIR_FIELDS
+    )
+
+
+def _pipeline_item(job):
+    """Turn a claimed queue job into the dict passed between pipeline stages."""
+    return dict(job["payload"], job_id=job["id"])
+
+
+def _read_attachment(attachment):
+    """Return the spooled bytes of an attachment."""
+    with open(attachment["path"], "rb") as f:
+        return f.read()
+
+
+def _checkpoint(stage_name, job):
+    """Pipeline progress hook: persist the stage a job finished and its results so far."""
+    job["done_stages"].append(stage_name)
+    payload = {key: value for key, value in job.items() if key != "job_id"}
+    payload["attachments"] = [{key: value for key, value in attachment.items() if key != "text"}
+                              for attachment in job["attachments"]]
+    job_queue.advance(job["job_id"], stage_name, payload)
+
+
+def _job_failed(stage_name, job, error):
+    """Pipeline error hook: return the job to the queue for a later retry."""
+    _fail_job(job, f"{stage_name}: {error}")
+
+
+def _fail_job(job, error):
+    """Record a failed attempt; once the job will not be retried, release its attachments' ledger claims."""
+    if job_queue.fail(job["job_id"], error) == FAILED:
+        for attachment in job["attachments"]:
+            _release_claim(job, attachment)
+
+
+def _release_claim(job, attachment):
+    """Drop the pending ledger claim of an attachment that did not reach the sheet, so a resend is accepted."""
+    if "sha256" in attachment:
+        dedup_ledger.release(attachment["sha256"], job.get("sender", ""))
+
+
+def _release_spool(path, job_id=None):
+    """Delete a spooled attachment unless another unfinished job still uses it.
+
+    Spool files are named after their content, so emails from different
+    senders with the same attachment share one file.
+    """
+    if job_queue.references(os.path.basename(path), exclude_id=job_id):
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _complete_job(job):
+    """Mark a job done and drop its spooled attachments."""
+    job_queue.complete(job["job_id"])
+    for attachment in job["attachments"]:
+        _release_spool(attachment["path"], job["job_id"])
+
+
+def extract_email_job(job):
+    """Pipeline stage (process pool): extract the text of every attachment of an email.
+
+    Runs again for resumed jobs that had not been parsed yet; the extraction
+    cache makes that cheap. An attachment without any text is skipped; any
+    other extraction error raises, so the job is retried.
+    """
+    if "parse" in job["done_stages"]:
+        return job
+    for attachment in job["attachments"]:
+        report = {}
+        try:
+            attachment["text"] = extract_resume_text(attachment["filename"], _read_attachment(attachment),
+                                                     max_chars=EXTRACTION_CHAR_BUDGET, report=report)
+        except NoTextError as e:
+            print(f"❌ {e}")
+            continue
+        if report.get("truncated"):
+            print(f"⚠️ {attachment['filename']} is very long, extraction stopped at {EXTRACTION_CHAR_BUDGET} chars: {report}")
+    return job
+
+
+async def parse_email_job(job):
+    """Pipeline stage (async): parse attachments in order until one has all the required fields."""
+    if "parse" in job["done_stages"]:
+        return job
+    for attachment in job["attachments"]:
+        if "text" not in attachment:
+            continue
+        resume_data = await parse_resume_async(attachment["text"], file_name=attachment["filename"])
+        attachment["parsed"] = resume_data
+        if "error" in resume_data:
+            print(f"❌ Error parsing {attachment['filename']}: {resume_data['error']}")
+        elif has_required_fields(resume_data):
+            print(f"✅ Attachment {attachment['filename']} contains all required resume data, skipping remaining attachments")
+            break
+    return job
+
+
+def upload_email_job(job):
+    """Pipeline stage (threads): upload every parsed attachment of an email to Google Drive.
+
+    A failed upload raises, so the job goes back to the queue instead of
+    reaching the sheet without its link.
+    """
+    for attachment in job["attachments"]:
+        if "parsed" not in attachment or "file_link" in attachment:
+            continue
+        # The Drive helper authenticates on its own and ignores the client argument
+        drive_name = attachment.get("original_filename", attachment["filename"])
+        # Streamed from the spool file rather than loaded into memory
+        # Keyed on the unique local name, so a retry reuses an upload its failed attempt already made
+        file_link = upload_to_google_drive(drive_name, None, None, local_path=attachment["path"], raise_errors=True,
+                                           dedupe_key=attachment["filename"])
+        if not file_link:
+            raise RuntimeError(f"Google Drive returned no link for {attachment['filename']}")
+        attachment["file_link"] = file_link
+        print(f"🔗 Generated link for {attachment['filename']}: {file_link}")
+        save_email_metadata(attachment["filename"], {"drive_link": file_link})
+    return job
+
+
+def publish_email_job(job):
+    """Pipeline stage (single thread, the sheet inserts at a fixed row): write parsed attachments to the sheet.
+
+    A failed write raises so the job is retried; attachments already in the
+    sheet (e.g. written before a retry) are skipped by the sheet helper.
+    Written attachments are marked done in the dedup ledger; the claims of
+    attachments that were not parsed are released.
+    """
+    if "sheet" in job["done_stages"]:
+        return job
+    for attachment in job["attachments"]:
+        resume_data = attachment.get("parsed")
+        if not resume_data or "error" in resume_data:
+            _release_claim(job, attachment)
+            continue
+        prepare_sheet_row(resume_data, attachment["filename"], attachment.get("file_link"), job["email_date"])
+        write_to_google_sheet(resume_data, SPREADSHEET_ID, raise_errors=True)
+        if "sha256" in attachment:
+            # Rows are inserted at the top of the sheet, so the row number would not stay valid
+            dedup_ledger.complete(attachment["sha256"], job.get("sender", ""),
+                                  attachment.get("file_link") or attachment["filename"])
+        print(f"ℹ️ Resume data extracted: {resume_data}")
+    return job
+
+
+def build_ingestion_pipeline():
+    """Return the extract -> parse -> upload -> sheet pipeline used for email attachments.
+
+    Every finished stage is checkpointed in the job queue and failed jobs are
+    returned to it for a retry.
+    """
+    return Pipeline(on_progress=_checkpoint, on_error=_job_failed, stages=[
+        Stage("extract", extract_email_job, kind="process", workers=PIPELINE_EXTRACT_WORKERS, pool=extract_pool),
+        Stage("parse", parse_email_job, kind="async", workers=PIPELINE_PARSE_CONCURRENCY),
+        Stage("upload", upload_email_job, kind="thread", workers=PIPELINE_UPLOAD_WORKERS),
+        Stage("sheet", publish_email_job, kind="thread", workers=1),
+    ])
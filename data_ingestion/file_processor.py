@@ -1,79 +1,298 @@
 """Functions for extracting and parsing resume files."""
 
-import fitz
 import pandas as pd
 import json
 import re
 import logging
 import os
-from pdf2image import convert_from_path
-import easyocr
-import numpy as np
 import docx
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from docx.oxml.text.paragraph import CT_P
 from docx.oxml.table import CT_Tbl
 from typing import Union, Dict
 from datetime import date, datetime
 from data_ingestion.config import SAVE_DIR
+from groq import BadRequestError
 from grok_work.groq_cilent import client
 from Google_work.google_sheet import write_to_google_sheet
-from data_ingestion.config import SPREADSHEET_ID
+from data_ingestion.config import SPREADSHEET_ID, OCR_MIN_PAGE_CHARS, OCR_MODE, OCR_MAX_WORKERS, OCR_DOC_TIMEOUT
+from data_ingestion.config import EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_BYTES
+from data_ingestion.ocr_engine import ocr_pdf_pages, open_pdf
+from data_ingestion.docx_stream import extract_docx_stream
+from data_ingestion.pre_extractor import pre_extract
+from data_ingestion.prompt_packer import pack_resume_text, count_tokens, segment_resume, truncate_to_tokens
+from data_ingestion.config import RESUME_TOKEN_BUDGET, EXTRACTION_CHAR_BUDGET, BATCH_TOKEN_BUDGET, BATCH_MAX_SIZE
+from data_ingestion.config import PARSE_CACHE_DIR, PARSE_CACHE_MAX_BYTES, PARSE_CACHE_TTL, PRE_EXTRACT_MIN_SKILLS, PARSE_JSON_MODE
+from data_ingestion.config import REPAIR_FIELDS, REPAIR_TOKEN_BUDGET
+from data_ingestion.cache import DiskCache, sha256_file, sha256_bytes
+from data_ingestion.structured_output import IncrementalJSONParser, validate_resume_fields
 logger = logging.getLogger(__name__)
 
+# Bump when extraction output changes so stale cache entries are ignored
+EXTRACTOR_VERSION = 3
+extraction_cache = DiskCache(EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_BYTES, version=EXTRACTOR_VERSION)
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extract text from a PDF file with OCR fallback."""
-    logger.info(f"Extracting text from PDF: {pdf_path}")
-    text = ""
+PARSE_MODEL = "gemma2-9b-it"
+RESUME_FIELDS = [
+    "Name", "Email Id", "Contact No", "Current Location", "Total Experience", "Designation", "Skills",
+    "CTC info", "No of companies worked with till today", "Last company worked with", "Loyalty %", "Category",
+]
+# Bump when the parse_resume prompt changes so cached parses are ignored
+PROMPT_VERSION = 5
+parse_cache = DiskCache(PARSE_CACHE_DIR, PARSE_CACHE_MAX_BYTES, version=PROMPT_VERSION, ttl=PARSE_CACHE_TTL)
+
+# Resume sections most likely to hold each repairable field, best first
+REPAIR_SECTIONS = {
+    "Name": ["contact", "summary"],
+    "Total Experience": ["experience", "summary", "contact"],
+    "Skills": ["skills", "experience", "projects", "summary"],
+}
+EMPTY_VALUES = {"", "n/a", "na", "none", "null", "unknown", "not mentioned", "not available", "not specified"}
+_repair_stats = {"parses": 0, "repairs": 0, "fields_repaired": 0, "fields_unresolved": 0}
+_repair_stats_lock = threading.Lock()
+
+
+def _has_text_layer(page_text: str) -> bool:
+    """Return True if a page's embedded text is usable without OCR."""
+    return len(page_text.strip()) >= OCR_MIN_PAGE_CHARS
+
+
+def _truncate_to_budget(text, max_chars, report):
+    """Cut text to max_chars, recording how many characters were dropped."""
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    if report is not None:
+        report["truncated"] = True
+        report["chars_truncated"] = report.get("chars_truncated", 0) + len(text) - max_chars
+    return text[:max_chars]
+
+
+class NoTextError(ValueError):
+    """Raised when a resume file yields no text at all."""
+
+
+def _require_text(text, name):
+    """Return text, raising NoTextError if it is empty."""
+    if not text or not text.strip():
+        raise NoTextError(f"No text could be extracted from {name}")
+    return text
+
+
+def _cached_extract(cache_key, name, extract, max_chars, report):
+    """Return cached extraction output for cache_key, or run extract(report) and cache it.
+
+    Output covering the whole document is cached under cache_key and serves
+    every budget. A read that stopped at the max_chars budget is cached
+    under a key that includes the budget, together with its report, so the
+    next read with the same budget is a hit too. Empty output and reads cut
+    short by the OCR time limit are not cached.
+    """
+    budget_key = f"{cache_key}-{max_chars}" if max_chars is not None else None
+    cached = extraction_cache.get(cache_key)
+    if cached is None and budget_key:
+        budgeted = extraction_cache.get(budget_key)
+        if budgeted is not None:
+            if report is not None:
+                report.update(budgeted["report"])
+            cached = budgeted["text"]
+    if cached is not None:
+        logger.info(f"Using cached text for {name}")
+        if report is not None:
+            report["cached"] = True
+        if isinstance(cached, str):
+            return _truncate_to_budget(cached, max_chars, report)
+        return cached
+
+    extract_report = {}
+    result, complete = extract(extract_report)
+    if report is not None:
+        report.update(extract_report)
+    if not result or (isinstance(result, str) and not result.strip()):
+        return result
+    if complete:
+        extraction_cache.put(cache_key, result)
+    elif budget_key and not extract_report.get("ocr_timed_out"):
+        extraction_cache.put(budget_key, {"text": result, "report": extract_report})
+    return result
+
+
+def extract_text_from_pdf(pdf_path: str, max_chars=None, report=None) -> str:
+    """Extract text from a PDF file, stopping once max_chars have been collected.
+
+    If a report dict is given it is filled with page counts and the number
+    of pages and characters skipped because of the budget.
+    """
+    return _cached_extract(
+        f"{sha256_file(pdf_path)}-pdf", pdf_path,
+        lambda report: _extract_text_from_pdf(pdf_path, pdf_path, max_chars, report),
+        max_chars, report,
+    )
+
+
+def extract_text_from_pdf_bytes(pdf_bytes, name="<memory>", max_chars=None, report=None) -> str:
+    """Extract text from in-memory PDF bytes (e.g. an email attachment or upload)."""
+    return _cached_extract(
+        f"{sha256_bytes(pdf_bytes)}-pdf", name,
+        lambda report: _extract_text_from_pdf(pdf_bytes, name, max_chars, report),
+        max_chars, report,
+    )
+
+
+def _extract_text_from_pdf(source, name, max_chars=None, report=None):
+    """Extract text from a PDF path or bytes, OCR-ing only the pages without a text layer.
+
+    Pages are walked in order until max_chars characters are known; OCR is
+    batched so no page past that point is ever rasterised, and all batches
+    share one OCR_DOC_TIMEOUT deadline. Returns the text and whether the
+    whole document was read.
+    """
+    logger.info(f"Extracting text from PDF: {name}")
+    complete = True
+    page_texts = []
+    ocr_pages = []
+    pending_ocr = []
+    collected = 0
+    ocr_batch_size = OCR_MAX_WORKERS if OCR_MODE == "process" else 1
+    ocr_deadline = time.monotonic() + OCR_DOC_TIMEOUT
+
+    def run_ocr():
+        nonlocal complete, collected
+        remaining = ocr_deadline - time.monotonic()
+        if remaining <= 0:
+            logger.warning(f"OCR time limit of {OCR_DOC_TIMEOUT}s reached, skipping pages {pending_ocr}")
+            complete = False
+            if report is not None:
+                report["ocr_timed_out"] = True
+            pending_ocr.clear()
+            return
+        logger.info(f"Pages {pending_ocr} have no text layer, attempting OCR...")
+        try:
+            ocr_texts = ocr_pdf_pages(source, pending_ocr, timeout=remaining)
+        except Exception as e:
+            logger.error(f"Error during OCR extraction: {e}")
+            raise
+        if len(ocr_texts) < len(pending_ocr):
+            complete = False
+            if report is not None:
+                report["ocr_timed_out"] = True
+        for page_num in pending_ocr:
+            page_text = ocr_texts.get(page_num, "")
+            print(f"Extracted from OCR (Page {page_num}):", repr(page_text[:500]))
+
+            if page_text.strip():
+                page_texts[page_num - 1] = page_text
+                collected += len(page_text) + 1
+            else:
+                logger.warning(f"No text extracted from OCR on page {page_num}")
+        pending_ocr.clear()
 
     try:
-        with fitz.open(pdf_path) as doc:
+        with open_pdf(source) as doc:
+            page_count = len(doc)
             for page_num, page in enumerate(doc, start=1):
+                if max_chars is not None and collected >= max_chars:
+                    break
                 page_text = page.get_text()
-                if page_text:
+                page_texts.append(page_text)
+                if _has_text_layer(page_text):
                     print(f"Extracted from fitz (Page {page_num}):", repr(page_text[:500]))
-                    text += page_text + "\n"
-
-        if text.strip():
-            return text
+                    collected += len(page_text) + 1
+                else:
+                    ocr_pages.append(page_num)
+                    pending_ocr.append(page_num)
+                    if max_chars is not None and len(pending_ocr) >= ocr_batch_size:
+                        run_ocr()
     except Exception as e:
         logger.error(f"Error extracting text from PDF with fitz: {e}")
+        raise
 
-    try:
-        logger.info("No text found using pdfplumber, attempting OCR...")
-        images = convert_from_path(pdf_path, dpi=200)
-        logger.info(f"Converted PDF to {len(images)} image(s)")
-        reader = easyocr.Reader(['en'], gpu=False)
-
-        for i, image in enumerate(images):
-            logger.info(f"Processing page {i + 1} with OCR...")
-            image_np = np.array(image)
-            results = reader.readtext(image_np)
-            page_text = ' '.join([result[1] for result in results])
-            print(f"Extracted from OCR (Page {i + 1}):", repr(page_text[:500]))
-
-            if page_text.strip():
-                text += page_text + "\n"
-            else:
-                logger.warning(f"No text extracted from OCR on page {i + 1}")
-
+    if pending_ocr:
+        run_ocr()
+
+    pages_skipped = page_count - len(page_texts)
+    if pages_skipped:
+        complete = False
+        logger.info(f"Prompt budget of {max_chars} chars met, skipped {pages_skipped} of {page_count} page(s)")
+    if report is not None:
+        report.update({
+            "pages_total": page_count,
+            "pages_read": len(page_texts),
+            "pages_skipped": pages_skipped,
+            "ocr_pages": len(ocr_pages),
+        })
+        if pages_skipped:
+            report["truncated"] = True
+
+    text = "".join(page_text + "\n" for page_text in page_texts if page_text.strip())
+    if ocr_pages:
         if text.strip():
             logger.info("OCR extraction successful!")
         else:
             logger.warning("OCR extraction failed. No text found.")
-        return text if text.strip() else "No text could be extracted from the PDF."
+    if not text.strip():
+        # Callers treat empty text as a failed extraction; it is never cached
+        return "", False
+    truncated = _truncate_to_budget(text, max_chars, report)
+    # Text cut to the budget must not be cached as the whole document
+    return truncated, complete and len(truncated) == len(text)
+
+
+def extract_text_from_docx(docx_path: str, advanced_mode=False, max_chars=None, report=None) -> Union[str, Dict]:
+    """Extract text from a DOCX file, stopping once max_chars have been collected.
+
+    The budget only applies to plain-text mode; advanced mode always reads
+    the whole document.
+    """
+    return _cached_extract(
+        f"{sha256_file(docx_path)}-docx{'-advanced' if advanced_mode else ''}", docx_path,
+        lambda report: _extract_text_from_docx(docx_path, docx_path, advanced_mode, max_chars, report),
+        max_chars, report,
+    )
+
+
+def extract_text_from_docx_bytes(docx_bytes, advanced_mode=False, name="<memory>", max_chars=None, report=None) -> Union[str, Dict]:
+    """Extract text from in-memory DOCX bytes (e.g. an email attachment or upload)."""
+    return _cached_extract(
+        f"{sha256_bytes(docx_bytes)}-docx{'-advanced' if advanced_mode else ''}", name,
+        lambda report: _extract_text_from_docx(BytesIO(docx_bytes), name, advanced_mode, max_chars, report),
+        max_chars, report,
+    )
+
+
+def _extract_text_from_docx(source, name, advanced_mode=False, max_chars=None, report=None):
+    """Extract text from a DOCX path or file-like object with the streaming XML extractor.
+
+    Falls back to python-docx if the package cannot be streamed. Returns the
+    result and whether the whole document was read.
+    """
+    logger.info(f"Extracting text from DOCX: {name}")
+    try:
+        return extract_docx_stream(source, advanced_mode, max_chars, report)
     except Exception as e:
-        logger.error(f"Error during OCR extraction: {e}")
-        raise
+        logger.warning(f"Streaming DOCX extraction failed for {name}, falling back to python-docx: {e}")
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return _extract_text_from_docx_legacy(source, name, advanced_mode, max_chars, report)
 
 
-def extract_text_from_docx(docx_path: str, advanced_mode=False) -> Union[str, Dict]:
-    """Extract text from a DOCX file with optional advanced parsing."""
-    logger.info(f"Extracting text from DOCX: {docx_path}")
+def _extract_text_from_docx_legacy(source, name, advanced_mode=False, max_chars=None, report=None):
+    """Extract text from a DOCX path or file-like object using python-docx objects.
+
+    Returns the result and whether the whole document was read.
+    """
+    if advanced_mode:
+        max_chars = None
 
     try:
-        doc = docx.Document(docx_path)
+        doc = docx.Document(source)
         full_text_parts = []
+        collected = 0
+        paragraphs_skipped = 0
+        tables_skipped = 0
 
         if advanced_mode:
             result = {
@@ -84,10 +303,15 @@ def extract_text_from_docx(docx_path: str, advanced_mode=False) -> Union[str, Di
                 "ordered_content": ""
             }
 
-        for para in doc.paragraphs:
+        paragraphs = doc.paragraphs
+        for para_idx, para in enumerate(paragraphs):
+            if max_chars is not None and collected >= max_chars:
+                paragraphs_skipped = len(paragraphs) - para_idx
+                break
             if not para.text.strip():
                 continue
             full_text_parts.append(para.text)
+            collected += len(para.text) + 1
 
             if advanced_mode:
                 is_heading = para.style.name.startswith('Heading')
@@ -102,13 +326,18 @@ def extract_text_from_docx(docx_path: str, advanced_mode=False) -> Union[str, Di
                 if is_heading:
                     result["headers"].append(para.text)
 
-        for table in doc.tables:
+        tables = doc.tables
+        for table_idx, table in enumerate(tables):
+            if max_chars is not None and collected >= max_chars:
+                tables_skipped = len(tables) - table_idx
+                break
             table_data = []
             for row in table.rows:
                 row_data = [cell.text for cell in row.cells]
                 row_text = " | ".join(cell.text for cell in row.cells if cell.text.strip())
                 if row_text:
                     full_text_parts.append(row_text)
+                    collected += len(row_text) + 1
                 if advanced_mode:
                     table_data.append(row_data)
             if advanced_mode:
@@ -139,16 +368,38 @@ def extract_text_from_docx(docx_path: str, advanced_mode=False) -> Union[str, Di
 
             result["ordered_content"] = all_elements_text
             result["full_text"] = "\n".join(full_text_parts)
-            return result
-        else:
-            return "\n".join(full_text_parts)
+            return result, True
+
+        complete = not (paragraphs_skipped or tables_skipped)
+        if not complete:
+            logger.info(f"Prompt budget of {max_chars} chars met, skipped {paragraphs_skipped} paragraph(s) and {tables_skipped} table(s)")
+        if report is not None:
+            report.update({"paragraphs_skipped": paragraphs_skipped, "tables_skipped": tables_skipped})
+            if not complete:
+                report["truncated"] = True
+        text = "\n".join(full_text_parts)
+        truncated = _truncate_to_budget(text, max_chars, report)
+        return truncated, complete and len(truncated) == len(text)
     except Exception as e:
         logger.error(f"Error extracting text from DOCX: {e}")
         raise
 
 
-def parse_resume(resume_text, file_name=None):
-    """Parse resume text using Groq API with optional email metadata."""
+def _parse_cache_key(resume_text, model, email_ctc, experience_from_email):
+    """Build the parse cache key from normalised resume text and prompt inputs."""
+    normalised_text = re.sub(r'\s+', ' ', resume_text).strip()
+    key_data = {
+        "text": normalised_text,
+        "prompt_version": PROMPT_VERSION,
+        "model": model,
+        "ctc_from_email": email_ctc,
+        "experience_from_email": experience_from_email,
+    }
+    return sha256_bytes(json.dumps(key_data, sort_keys=True).encode('utf-8'))
+
+
+def _load_email_overrides(file_name):
+    """Return the CTC and experience found in the email for file_name, if any."""
     email_ctc = None
     experience_from_email = None
     if file_name:
@@ -164,32 +415,64 @@ def parse_resume(resume_text, file_name=None):
                         print(f"📊 Using CTC from email for {file_name}: {email_ctc}")
             except Exception as e:
                 print(f"⚠️ Warning: Could not read metadata: {e}")
-
+    return email_ctc, experience_from_email
+
+
+def _prepare_parse(resume_text, file_name=None):
+    """Collect everything needed to parse one resume: overrides, known fields, packed text and cache key."""
+    email_ctc, experience_from_email = _load_email_overrides(file_name)
+    full_text = resume_text
+
+    # Fields found deterministically are filled in directly and left out of the prompt
+    pre_extracted = pre_extract(resume_text)
+    known_fields = {key: pre_extracted[key] for key in ("Email Id", "Contact No") if key in pre_extracted}
+    if pre_extracted["skills_found"] >= PRE_EXTRACT_MIN_SKILLS:
+        known_fields["Skills"] = pre_extracted["Skills"]
+    if known_fields:
+        print(f"🔎 Pre-extracted {', '.join(known_fields)} for {file_name or 'resume'}")
+    resume_text = pack_resume_text(resume_text, RESUME_TOKEN_BUDGET)
+
+    return {
+        "file_name": file_name,
+        "full_text": full_text,
+        "resume_text": resume_text,
+        "email_ctc": email_ctc,
+        "experience_from_email": experience_from_email,
+        "pre_extracted": pre_extracted,
+        "known_fields": known_fields,
+        "requested_fields": [field for field in RESUME_FIELDS if field not in known_fields],
+        "cache_key": _parse_cache_key(resume_text, PARSE_MODEL, email_ctc, experience_from_email),
+    }
+
+
+def _cached_parse(job):
+    """Return the cached parse for a prepared resume, or None."""
+    label = job["file_name"] or "resume"
+    cached = parse_cache.get(job["cache_key"])
+    if cached is not None:
+        logger.info(f"Parse cache hit for {label} ({parse_cache.stats()})")
+    else:
+        logger.info(f"Parse cache miss for {label} ({parse_cache.stats()})")
+    return cached
+
+
+def _field_instructions(requested_fields):
+    """Return the prompt section listing the keys to extract and how to fill them."""
     current_date = date.today().strftime("%Y-%m-%d")
-    prompt = f"""
-    Extract the following details from the resume.
-    Provide ONLY a JSON object with EXACTLY these keys (no variations):
-    
-    - Name
-    - Email Id
-    - Contact No
-    - Current Location
-    - Total Experience
-    - Designation
-    - Skills
-    - CTC info
-    - No of companies worked with till today
-    - Last company worked with
-    - Loyalty %
-    - Category  # New field added
+    field_list = "\n    ".join(f"- {field}" for field in requested_fields)
+    instructions = f"""
+    {field_list}
     
     Instructions for specific fields:
     - Total Experience: Express in years.
         * If explicitly mentioned, use that value.
         * If not mentioned, calculate by summing professional position durations.
         * If a position has "Present" or no end date, use {current_date} for calculation.
-    - Skills: Provide as comma-separated values.
-    - Loyalty %: Calculate using formula: ((Total Years Worked / Number of Companies) / Total Career Duration) * 100
+    """
+    if "Skills" in requested_fields:
+        instructions += """- Skills: Provide as comma-separated values.
+    """
+    instructions += """- Loyalty %: Calculate using formula: ((Total Years Worked / Number of Companies) / Total Career Duration) * 100
         * If career duration is zero (single company career), set to 100.
     - Category: Categorize into one of the following based on skills & designation:
         * "QA"
@@ -209,104 +492,514 @@ def parse_resume(resume_text, file_name=None):
         
         If unclear, infer from job roles and skills. If multiple roles exist, choose the **primary** role.
     """
+    return instructions
 
-    if email_ctc:
-        prompt += f"""
-        - CTC info: Use this exact value found in the email: "{email_ctc}" 
+
+def _override_instructions(job):
+    """Return prompt lines pinning fields to values found in the email."""
+    instructions = ""
+    if job["email_ctc"]:
+        instructions += f"""
+        - CTC info: Use this exact value found in the email: "{job['email_ctc']}" 
             * Do not try to extract CTC from the resume text.
         """
-    if experience_from_email:
-        prompt += f"""
-        - Total Experience: Use this exact value found in the email: "{experience_from_email} years" 
+    if job["experience_from_email"]:
+        instructions += f"""
+        - Total Experience: Use this exact value found in the email: "{job['experience_from_email']} years" 
             * Only calculate from resume if this value seems incorrect or inconsistent with the resume content.
         """
-    prompt += f"""
-        Provide the response in valid JSON format only, as a flat structure (no nested objects).
-        Ensure you format the response as a proper JSON object without any explanations or text outside the JSON structure.
-        
-        Resume:
-        {resume_text}
-        """
+    return instructions
+
+
+async def _request_completion(prompt, stream=True, json_mode=False):
+    """Send a prompt to the parse model and return the full response text.
 
-    completion = client.make_request(
-        model="gemma2-9b-it",
+    With json_mode the provider is asked to constrain the output to a JSON object.
+    """
+    extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+    completion = await client.make_request_async(
+        model=PARSE_MODEL,
         messages=[{"role": "user", "content": prompt}],
         temperature=0,
         max_completion_tokens=6790,
         top_p=0.95,
-        stream=True,
+        stream=stream,
+        **extra,
     )
+    if not stream:
+        return completion.choices[0].message.content or ""
 
     content = ""
-    for chunk in completion:
+    async for chunk in completion:
         content += chunk.choices[0].delta.content or ""
+    return content
+
+
+async def _stream_fields(prompt, requested_fields, on_field=None):
+    """Stream a completion, reporting each top-level field as soon as it completes.
+
+    Generation is stopped once every requested field has arrived. Returns the
+    parser (holding the fields seen) and the raw response text.
+    """
+    completion = await client.make_request_async(
+        model=PARSE_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0,
+        max_completion_tokens=6790,
+        top_p=0.95,
+        stream=True,
+    )
+    parser = IncrementalJSONParser()
+    pending = set(requested_fields)
+    content = ""
+    try:
+        async for chunk in completion:
+            delta = chunk.choices[0].delta.content or ""
+            content += delta
+            for key, value in parser.feed(delta):
+                pending.discard(key)
+                if on_field:
+                    on_field(key, value)
+            if parser.done or not pending:
+                break
+    finally:
+        # Closing the stream drops the connection so the model stops generating
+        await completion.close()
+    if not pending and not parser.done:
+        logger.info("All requested fields received, stopped generation early")
+    return parser, content
+
+
+def _is_empty(value):
+    """Return True if a parsed value carries no information."""
+    if value is None or value == [] or value == {}:
+        return True
+    return isinstance(value, str) and value.strip().lower() in EMPTY_VALUES
+
+
+def _record_repair(**counts):
+    """Add to the repair counters."""
+    with _repair_stats_lock:
+        for key, count in counts.items():
+            _repair_stats[key] += count
+
+
+def get_repair_stats():
+    """Return how many parses needed a repair call and how many fields it recovered."""
+    with _repair_stats_lock:
+        return dict(_repair_stats)
+
+
+def _repair_excerpt(full_text, fields):
+    """Return the resume sections relevant to fields, within REPAIR_TOKEN_BUDGET."""
+    sections = segment_resume(full_text)
+    wanted = []
+    for field in fields:
+        for section in REPAIR_SECTIONS[field]:
+            if section not in wanted:
+                wanted.append(section)
+    excerpt = "\n".join(text for section, text in sections if section in wanted)
+    return truncate_to_tokens(excerpt or full_text, REPAIR_TOKEN_BUDGET)
+
+
+async def _repair_fields(parsed, job):
+    """Fill empty REPAIR_FIELDS in parsed, asking the model only for those keys.
+
+    Skills are first taken from the dictionary matches if there are any. The
+    model then sees only the sections of the resume likely to contain the
+    remaining fields. Fields it still cannot fill are left as they were.
+    """
+    missing = [field for field in REPAIR_FIELDS if _is_empty(parsed.get(field))]
+    _record_repair(parses=1)
+    if "Skills" in missing and job["pre_extracted"].get("Skills"):
+        parsed["Skills"] = job["pre_extracted"]["Skills"]
+        missing.remove("Skills")
+        _record_repair(fields_repaired=1)
+    if not missing:
+        return parsed
+
+    label = job["file_name"] or "resume"
+    print(f"🩹 Repairing {', '.join(missing)} for {label}")
+    _record_repair(repairs=1)
+    field_list = "\n    ".join(f"- {field}" for field in missing)
+    hints = {
+        "Total Experience": f'Express in years. If a position has "Present" or no end date, count up to {date.today().strftime("%Y-%m-%d")}.',
+        "Skills": "Provide as comma-separated values.",
+    }
+    hint_list = "\n    ".join(f"- {field}: {hints[field]}" for field in missing if field in hints)
+    prompt = f"""
+    The following details could not be found in an earlier pass over this resume excerpt.
+    Provide ONLY a JSON object with EXACTLY these keys (no variations):
+    {field_list}
+
+    {hint_list}
+    Use null for anything that is genuinely not in the excerpt.
+
+    Resume excerpt:
+    {_repair_excerpt(job["full_text"], missing)}
+    """
+    try:
+        content = await _request_completion(prompt, stream=False, json_mode=PARSE_JSON_MODE)
+        json_match = re.search(r'({.*})', content, re.DOTALL)
+        repaired = validate_resume_fields(json.loads(json_match.group(1))) if json_match else {}
+    except Exception as e:
+        logger.warning(f"Repair request for {label} failed: {e}")
+        repaired = {}
+
+    fixed = [field for field in missing if not _is_empty(repaired.get(field))]
+    for field in fixed:
+        parsed[field] = repaired[field]
+    _record_repair(fields_repaired=len(fixed), fields_unresolved=len(missing) - len(fixed))
+    if len(fixed) < len(missing):
+        logger.warning(f"Could not repair {[f for f in missing if f not in fixed]} for {label}")
+    return parsed
+
+
+async def _finish_parse(parsed_json, job):
+    """Flatten and validate a parsed object, merge in the known fields and cache the result.
+
+    Empty required fields are repaired before the result is cached.
+
+    Raises ValueError if the object does not match the resume schema.
+    """
+    flattened_json = {}
+    for key, value in parsed_json.items():
+        if isinstance(value, dict):
+            for sub_key, sub_value in value.items():
+                flattened_json[sub_key] = sub_value
+        else:
+            flattened_json[key] = value
+    flattened_json = validate_resume_fields(flattened_json)
+    flattened_json.update(job["known_fields"])
+    if "LinkedIn" in job["pre_extracted"]:
+        flattened_json.setdefault("LinkedIn", job["pre_extracted"]["LinkedIn"])
+    flattened_json = await _repair_fields(flattened_json, job)
+    parse_cache.put(job["cache_key"], flattened_json)
+    return flattened_json
+
+
+async def _parse_job(job, on_field=None):
+    """Parse one prepared resume with its own completion.
+
+    Uses the provider's JSON mode when enabled; with an on_field callback, or
+    if JSON mode fails, the response is streamed and each field is passed to
+    on_field(key, value) as soon as it is complete.
+    """
+    if on_field:
+        for key, value in job["known_fields"].items():
+            on_field(key, value)
+
+    prompt = f"""
+    Extract the following details from the resume.
+    Provide ONLY a JSON object with EXACTLY these keys (no variations):
+    {_field_instructions(job["requested_fields"])}"""
+    prompt += _override_instructions(job)
+    prompt += f"""
+        Provide the response in valid JSON format only, as a flat structure (no nested objects).
+        Ensure you format the response as a proper JSON object without any explanations or text outside the JSON structure.
+        
+        Resume:
+        {job["resume_text"]}
+        """
+
+    if PARSE_JSON_MODE and on_field is None:
+        try:
+            content = (await _request_completion(prompt, stream=False, json_mode=True)).strip()
+            # Some models still wrap JSON-mode output in a code fence
+            json_match = re.search(r'({.*})', content, re.DOTALL)
+            return await _finish_parse(json.loads(json_match.group(1) if json_match else content), job)
+        except BadRequestError as e:
+            logger.warning(f"JSON mode request rejected, retrying with streaming: {e}")
+        except ValueError as e:
+            logger.warning(f"JSON mode response did not match the resume schema, retrying with streaming: {e}")
+
+    parser, content = await _stream_fields(prompt, job["requested_fields"], on_field)
+    if parser.fields and (parser.done or all(field in parser.fields for field in job["requested_fields"])):
+        try:
+            return await _finish_parse(parser.fields, job)
+        except ValueError as e:
+            return {"error": f"Invalid resume JSON: {e}", "raw_response": content}
 
     json_match = re.search(r'({.*})', content, re.DOTALL)
     if json_match:
         try:
-            parsed_json = json.loads(json_match.group(1))
-            flattened_json = {}
-            for key, value in parsed_json.items():
-                if isinstance(value, dict):
-                    for sub_key, sub_value in value.items():
-                        flattened_json[sub_key] = sub_value
-                else:
-                    flattened_json[key] = value
-            return flattened_json
-        except json.JSONDecodeError:
+            return await _finish_parse(json.loads(json_match.group(1)), job)
+        except ValueError:
             return {"error": "Failed to parse JSON", "raw_response": content}
     return {"error": "No JSON found", "raw_response": content}
 
 
-def process_single_resume(file_name, file_link=None, email_date=None):
-    """Process a single resume file and update Google Sheets."""
+def _run_sync(coro):
+    """Run a coroutine to completion from synchronous code.
+
+    If the calling thread already runs an event loop, the coroutine gets its
+    own loop on a helper thread instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+async def parse_resume_async(resume_text, file_name=None, on_field=None):
+    """Parse resume text using Groq API with optional email metadata.
+
+    If on_field is given it is called with each (key, value) as soon as the
+    field is known, so callers can show partial results. Many resumes can be
+    parsed concurrently; the client limits how many requests are in flight.
+    """
+    job = _prepare_parse(resume_text, file_name)
+    cached = _cached_parse(job)
+    if cached is not None:
+        if on_field:
+            for key, value in cached.items():
+                on_field(key, value)
+        return cached
+    return await _parse_job(job, on_field)
+
+
+def parse_resume(resume_text, file_name=None, on_field=None):
+    """Synchronous wrapper around parse_resume_async."""
+    return _run_sync(parse_resume_async(resume_text, file_name, on_field))
+
+
+async def parse_resumes_async(resumes):
+    """Parse (resume_text, file_name) pairs concurrently, each with its own completion."""
+    return await asyncio.gather(*(parse_resume_async(text, name) for text, name in resumes))
+
+
+def _plan_batches(jobs):
+    """Group prepared resumes into batches that fit the batch token budget."""
+    batches = []
+    current = []
+    current_tokens = 0
+    for job in jobs:
+        tokens = count_tokens(job["resume_text"])
+        if tokens > BATCH_TOKEN_BUDGET // 2:
+            batches.append([job])
+            continue
+        if current and (current_tokens + tokens > BATCH_TOKEN_BUDGET or len(current) >= BATCH_MAX_SIZE):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(job)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _parse_batch(batch):
+    """Parse several prepared resumes with one completion.
+
+    Returns a dict of document ID to parsed data for the entries that came
+    back valid; the caller re-parses the rest one by one.
+    """
+    requested_fields = [field for field in RESUME_FIELDS
+                        if any(field in job["requested_fields"] for job in batch)]
+    prompt = f"""
+    Extract the following details from each of the {len(batch)} resumes below.
+    Provide ONLY a JSON array with one object per resume. Each object must have a "Document ID" key
+    holding the resume's Document ID, plus EXACTLY these keys (no variations):
+    {_field_instructions(requested_fields)}"""
+    for job in batch:
+        overrides = _override_instructions(job)
+        if overrides:
+            prompt += f"""
+        For Document ID {job["doc_id"]} only:{overrides}"""
+    prompt += """
+        Provide the response as a valid JSON array only, each object a flat structure (no nested objects).
+        Do not add any explanations or text outside the JSON array.
+        """
+    for job in batch:
+        prompt += f"""
+        ===== Document ID: {job["doc_id"]} =====
+        {job["resume_text"]}
+        """
+
+    content = await _request_completion(prompt, stream=False)
+    results = {}
+    json_match = re.search(r'(\[.*\])', content, re.DOTALL)
+    if not json_match:
+        logger.warning("Batch parse returned no JSON array")
+        return results
+    try:
+        entries = json.loads(json_match.group(1))
+    except json.JSONDecodeError:
+        logger.warning("Batch parse returned malformed JSON")
+        return results
+
+    jobs_by_id = {str(job["doc_id"]): job for job in batch}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        job = jobs_by_id.get(str(entry.pop("Document ID", "")))
+        if job is None or str(job["doc_id"]) in results:
+            continue
+        missing = [field for field in job["requested_fields"] if field not in entry]
+        if missing:
+            logger.warning(f"Batch entry {job['doc_id']} is missing {missing}")
+            continue
+        try:
+            results[str(job["doc_id"])] = await _finish_parse(entry, job)
+        except ValueError as e:
+            logger.warning(f"Batch entry {job['doc_id']} failed validation: {e}")
+    return results
+
+
+async def _parse_planned_batch(batch):
+    """Parse one planned batch, re-parsing on its own any entry the batch did not return.
+
+    A resume whose parse raises gets an error dict; the rest of the batch is
+    unaffected.
+    """
+    batch_results = {}
+    if len(batch) > 1:
+        print(f"📦 Parsing {len(batch)} resumes in one request: {[job['doc_id'] for job in batch]}")
+        try:
+            batch_results = await _parse_batch(batch)
+        except Exception as e:
+            logger.warning(f"Batch parse failed, parsing its resumes one by one: {e}")
+
+    async def result_for(job):
+        if str(job["doc_id"]) in batch_results:
+            return batch_results[str(job["doc_id"])]
+        if len(batch) > 1:
+            print(f"↩️ Re-parsing {job['doc_id']} on its own")
+        return await _parse_job(job)
+
+    parsed = await asyncio.gather(*(result_for(job) for job in batch), return_exceptions=True)
+    results = {}
+    for job, result in zip(batch, parsed):
+        if isinstance(result, Exception):
+            logger.error(f"Error parsing {job['doc_id']}: {result}")
+            result = {"error": str(result)}
+        results[job["doc_id"]] = result
+    return results
+
+
+async def parse_resumes_batch_async(resumes):
+    """Parse several resumes, packing short ones into shared completions.
+
+    resumes is a list of (doc_id, resume_text, file_name) tuples. Returns a
+    dict of doc_id to parsed data, or to an error dict for each resume that
+    could not be parsed (an exception is reported only for its own resume).
+    Cached resumes cost nothing, batches are sized to BATCH_TOKEN_BUDGET and
+    BATCH_MAX_SIZE and sent concurrently, and any entry a batch fails to
+    return validly is parsed again on its own.
+    """
+    results = {}
+    pending = []
+    for doc_id, resume_text, file_name in resumes:
+        job = _prepare_parse(resume_text, file_name)
+        job["doc_id"] = doc_id
+        cached = _cached_parse(job)
+        if cached is not None:
+            results[doc_id] = cached
+        else:
+            pending.append(job)
+
+    for batch_results in await asyncio.gather(*(_parse_planned_batch(batch) for batch in _plan_batches(pending))):
+        results.update(batch_results)
+    return results
+
+
+def parse_resumes_batch(resumes):
+    """Synchronous wrapper around parse_resumes_batch_async."""
+    return _run_sync(parse_resumes_batch_async(resumes))
+
+
+def extract_resume_text(file_name, file_content, max_chars=None, report=None):
+    """Extract text from resume bytes, choosing the extractor by file extension.
+
+    Raises NoTextError if the file yields no text.
+    """
+    if file_name.lower().endswith(".pdf"):
+        text = extract_text_from_pdf_bytes(file_content, name=file_name, max_chars=max_chars, report=report)
+    else:
+        text = extract_text_from_docx_bytes(file_content, advanced_mode=False, name=file_name,
+                                            max_chars=max_chars, report=report)
+    return _require_text(text, file_name)
+
+
+def prepare_sheet_row(parsed_data, file_name, file_link=None, email_date=None):
+    """Fill in the File Name and Date columns of a parsed resume before it is written to the sheet."""
+    parsed_data["File Name"] = file_link if file_link else file_name
+
+    if email_date:
+        parsed_data["Date"] = email_date
+        print(f"📅 Using exact email date for spreadsheet: {email_date}")
+    else:
+        metadata_file = os.path.splitext(file_name)[0] + "_metadata.json"
+        metadata_path = os.path.join(SAVE_DIR, metadata_file)
+        if os.path.exists(metadata_path):
+            try:
+                with open(metadata_path, 'r') as f:
+                    metadata = json.load(f)
+                    if "email_date" in metadata:
+                        parsed_data["Date"] = metadata["email_date"]
+                        print(f"📅 Using date from metadata: {metadata['email_date']}")
+            except Exception as e:
+                print(f"⚠️ Warning: Could not read date from metadata: {e}")
+
+        if "Date" not in parsed_data:
+            parsed_data["Date"] = datetime.now().strftime("%d/%m/%Y")
+            print(f"⚠️ No date found in metadata, using today: {parsed_data['Date']}")
+
+    if "CTC info" in parsed_data:
+        print(f"💰 CTC information being added to spreadsheet: {parsed_data['CTC info']}")
+    return parsed_data
+
+
+async def process_single_resume_async(file_name, file_link=None, email_date=None, file_content=None):
+    """Process a single resume file and update Google Sheets.
+
+    When file_content is given the resume is extracted from memory and
+    SAVE_DIR is not read. Returns the parsed data, or None if processing failed.
+    Extraction and the sheet write run in worker threads so several resumes
+    can be processed concurrently on one event loop.
+    """
     file_path = os.path.join(SAVE_DIR, file_name)
     print(f"Processing resume: {file_name}")
 
     try:
-        if file_name.lower().endswith(".pdf"):
-            resume_text = extract_text_from_pdf(file_path)
+        max_chars = EXTRACTION_CHAR_BUDGET
+        report = {}
+        if file_content is not None:
+            resume_text = await asyncio.to_thread(extract_resume_text, file_name, file_content,
+                                                  max_chars=max_chars, report=report)
+        elif file_name.lower().endswith(".pdf"):
+            resume_text = await asyncio.to_thread(extract_text_from_pdf, file_path, max_chars=max_chars, report=report)
         else:
-            resume_text = extract_text_from_docx(file_path, advanced_mode=False)
+            resume_text = await asyncio.to_thread(extract_text_from_docx, file_path, advanced_mode=False,
+                                                  max_chars=max_chars, report=report)
+        _require_text(resume_text, file_name)
 
-        max_chars = 20000
-        if len(resume_text) > max_chars:
-            logger.warning(f"Resume is very long ({len(resume_text)} chars). Truncating to {max_chars} chars.")
-            resume_text = resume_text[:max_chars]
+        if report.get("truncated"):
+            logger.warning(f"Resume is very long, extraction stopped at {max_chars} chars: {report}")
 
-        parsed_data = parse_resume(resume_text, file_name=file_name)
+        parsed_data = await parse_resume_async(resume_text, file_name=file_name)
 
         if "error" in parsed_data:
             print(f"❌ Error parsing {file_name}: {parsed_data['error']}")
         else:
-            parsed_data["File Name"] = file_link if file_link else file_name
-
-            if email_date:
-                parsed_data["Date"] = email_date
-                print(f"📅 Using exact email date for spreadsheet: {email_date}")
-            else:
-                metadata_file = os.path.splitext(file_name)[0] + "_metadata.json"
-                metadata_path = os.path.join(SAVE_DIR, metadata_file)
-                if os.path.exists(metadata_path):
-                    try:
-                        with open(metadata_path, 'r') as f:
-                            metadata = json.load(f)
-                            if "email_date" in metadata:
-                                parsed_data["Date"] = metadata["email_date"]
-                                print(f"📅 Using date from metadata: {metadata['email_date']}")
-                    except Exception as e:
-                        print(f"⚠️ Warning: Could not read date from metadata: {e}")
-
-                if "Date" not in parsed_data:
-                    parsed_data["Date"] = datetime.now().strftime("%d/%m/%Y")
-                    print(f"⚠️ No date found in metadata, using today: {parsed_data['Date']}")
-
-            if "CTC info" in parsed_data:
-                print(f"💰 CTC information being added to spreadsheet: {parsed_data['CTC info']}")
-
-            write_to_google_sheet(parsed_data, SPREADSHEET_ID)
+            prepare_sheet_row(parsed_data, file_name, file_link, email_date)
+            await asyncio.to_thread(write_to_google_sheet, parsed_data, SPREADSHEET_ID)
 
+        return parsed_data
     except Exception as e:
         print(f"❌ Error processing {file_name}: {e}")
         import traceback
-        print(traceback.format_exc())
\ No newline at end of file
+        print(traceback.format_exc())
+        return None
+
+
+def process_single_resume(file_name, file_link=None, email_date=None, file_content=None):
+    """Synchronous wrapper around process_single_resume_async."""
+    return _run_sync(process_single_resume_async(file_name, file_link, email_date, file_content))
+
+
+async def process_resumes_async(resumes):
+    """Process (file_name, file_link, email_date, file_content) tuples concurrently."""
+    return await asyncio.gather(*(process_single_resume_async(*resume) for resume in resumes))
\ No newline at end of file
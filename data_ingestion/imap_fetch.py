@@ -0,0 +1,524 @@
+"""Two-phase IMAP fetching: read BODYSTRUCTURE and headers first, then download only the parts that are needed."""
+
+import base64
+import binascii
+import email
+import email.header
+import email.utils
+import hashlib
+import os
+import queue
+import quopri
+import re
+import tempfile
+import threading
+import urllib.parse
+import logging
+from data_ingestion.config import IMAP_FETCH_BATCH, IMAP_PREFETCH_BATCHES, IMAP_FETCH_CHUNK
+from data_ingestion.imap_sync import compact_uid_set
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_HEADERS = ("FROM", "SUBJECT", "DATE", "MESSAGE-ID")
+SUMMARY_ITEMS = f"(UID INTERNALDATE BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({' '.join(SUMMARY_HEADERS)})])"
+
+_DONE = object()
+_OPEN = object()
+_CLOSE = object()
+_LITERAL_SIZE = re.compile(rb"\{(\d+)\}\s*$")
+_ATOM_END = b' ()"{\r\n'
+_NON_BASE64 = re.compile(rb"[^A-Za-z0-9+/=]")
+
+
+class Literal(bytes):
+    """A string sent as an IMAP literal or quoted string (as opposed to an atom)."""
+
+
+def _tokenize_text(text, tokens):
+    """Append the tokens of one chunk of an IMAP response line."""
+    i = 0
+    while i < len(text):
+        char = text[i:i + 1]
+        if char in b" \r\n":
+            i += 1
+        elif char == b"(":
+            tokens.append(_OPEN)
+            i += 1
+        elif char == b")":
+            tokens.append(_CLOSE)
+            i += 1
+        elif char == b'"':
+            value = bytearray()
+            i += 1
+            while i < len(text) and text[i:i + 1] != b'"':
+                if text[i:i + 1] == b"\\":
+                    i += 1
+                value += text[i:i + 1]
+                i += 1
+            tokens.append(Literal(value))
+            i += 1
+        else:
+            start = i
+            depth = 0
+            # Section specs such as BODY[HEADER.FIELDS (FROM)] are one atom
+            while i < len(text) and (depth or text[i:i + 1] not in _ATOM_END):
+                if text[i:i + 1] == b"[":
+                    depth += 1
+                elif text[i:i + 1] == b"]":
+                    depth -= 1
+                i += 1
+            atom = text[start:i].decode("ascii", errors="replace")
+            tokens.append(None if atom.upper() == "NIL" else atom)
+
+
+def _tokenize(data):
+    """Tokenize an imaplib response; (line, literal) tuples carry the literal of the line's trailing {n}."""
+    tokens = []
+    for item in data:
+        if isinstance(item, tuple):
+            line, literal = item
+            _tokenize_text(_LITERAL_SIZE.sub(b"", line), tokens)
+            tokens.append(Literal(literal))
+        elif isinstance(item, bytes):
+            _tokenize_text(item, tokens)
+    return tokens
+
+
+def _parse_list(tokens, i):
+    """Parse the parenthesised list starting after tokens[i - 1]; return (list, next index)."""
+    items = []
+    while i < len(tokens):
+        token = tokens[i]
+        if token is _OPEN:
+            nested, i = _parse_list(tokens, i + 1)
+            items.append(nested)
+        elif token is _CLOSE:
+            return items, i + 1
+        else:
+            items.append(token)
+            i += 1
+    return items, i
+
+
+def parse_fetch_response(data):
+    """Return {uid: {ITEM: value}} for the FETCH responses in an imaplib UID FETCH result.
+
+    Responses without a UID (unsolicited flag updates) are ignored. Item
+    names are upper-cased; BODY[...] values are the raw section bytes.
+    """
+    tokens = _tokenize(data)
+    messages = {}
+    i = 0
+    while i < len(tokens):
+        # <sequence number> FETCH ( ... ) -- imaplib strips the leading "* " and FETCH is optional here
+        if tokens[i] is not _OPEN:
+            i += 1
+            continue
+        items, i = _parse_list(tokens, i + 1)
+        fields = {}
+        for key, value in zip(items[0::2], items[1::2]):
+            if isinstance(key, str):
+                fields[key.upper()] = value
+        if "UID" in fields:
+            messages.setdefault(int(fields["UID"]), {}).update(fields)
+    return messages
+
+
+def _text(value):
+    """Return an IMAP string or atom as str (None stays None)."""
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def _params(values):
+    """Turn an IMAP (key value key value ...) list into a dict with lower-case keys."""
+    if not isinstance(values, list):
+        return {}
+    return {_text(key).lower(): _text(value) for key, value in zip(values[0::2], values[1::2]) if key}
+
+
+def _decode_filename(params):
+    """Return the filename from disposition/type params, decoding RFC 2231 and RFC 2047 encodings."""
+    continuations = sorted(
+        (int(match.group(1) or 0), key, value)
+        for key, value in params.items()
+        if (match := re.fullmatch(r"(?:filename|name)\*(\d*)\*?", key)) and value
+    )
+    if continuations:
+        raw = "".join(value for _, _, value in continuations)
+        if any(key.endswith("*") for _, key, _ in continuations) and raw.count("'") >= 2:
+            charset, _, encoded = raw.split("'", 2)
+            try:
+                return urllib.parse.unquote(encoded, encoding=charset or "utf-8", errors="replace")
+            except LookupError:
+                return urllib.parse.unquote(encoded, errors="replace")
+        return raw
+    name = params.get("filename") or params.get("name")
+    if not name:
+        return None
+    try:
+        return str(email.header.make_header(email.header.decode_header(name)))
+    except Exception:
+        return name
+
+
+def _extension(values, start):
+    """Return (disposition, disposition params) from the extension data of a single part."""
+    disposition = values[start] if len(values) > start else None
+    if isinstance(disposition, list) and disposition:
+        return _text(disposition[0]).lower(), _params(disposition[1] if len(disposition) > 1 else None)
+    return None, {}
+
+
+def body_parts(structure, section=""):
+    """Flatten a parsed BODYSTRUCTURE into a list of leaf parts.
+
+    Each part is a dict with section (the BODY[] part number), content_type,
+    params, encoding, size, disposition and filename. Parts of attached
+    messages are included with their nested section numbers.
+    """
+    if not isinstance(structure, list) or not structure:
+        return []
+    if isinstance(structure[0], list):
+        parts = []
+        # Child bodies come first, then the multipart subtype and its extension data
+        children = []
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            children.append(child)
+        for index, child in enumerate(children, 1):
+            parts.extend(body_parts(child, f"{section}.{index}" if section else str(index)))
+        return parts
+
+    main_type = (_text(structure[0]) or "").lower()
+    sub_type = (_text(structure[1]) or "").lower()
+    params = _params(structure[2])
+    encoding = (_text(structure[5]) or "7bit").lower()
+    size = int(structure[6]) if len(structure) > 6 and str(structure[6]).isdigit() else 0
+    own_section = section or "1"
+
+    if main_type == "message" and sub_type == "rfc822" and len(structure) > 8:
+        nested = structure[8]
+        if isinstance(nested, list) and nested and isinstance(nested[0], list):
+            return body_parts(nested, own_section)
+        return body_parts(nested, f"{own_section}.1")
+
+    # Extension data follows the basic fields: text parts have a line count, then MD5 and disposition
+    disposition, disposition_params = _extension(structure, 9 if main_type == "text" else 8)
+    return [{
+        "section": own_section,
+        "content_type": f"{main_type}/{sub_type}",
+        "params": params,
+        "encoding": encoding,
+        "size": size,
+        "disposition": disposition,
+        "filename": _decode_filename(disposition_params) or _decode_filename(params),
+    }]
+
+
+def fetch_summaries(mail, uids):
+    """Phase one: fetch UID, INTERNALDATE, BODYSTRUCTURE and a few headers for uids.
+
+    Returns {uid: {"uid", "internaldate", "headers", "parts"}} where headers is an
+    email.message.Message holding only the summary headers, or None if the
+    FETCH failed. UIDs that no longer exist are simply missing.
+    """
+    if not uids:
+        return {}
+    status, data = mail.uid("FETCH", compact_uid_set(uids), SUMMARY_ITEMS)
+    if status != "OK":
+        print(f"❌ Summary fetch failed for {len(uids)} message(s): {data}")
+        return None
+
+    summaries = {}
+    for uid, fields in parse_fetch_response(data).items():
+        header_bytes = next((bytes(value) for key, value in fields.items()
+                             if key.startswith("BODY[HEADER") and isinstance(value, bytes)), b"")
+        summaries[uid] = {
+            "uid": uid,
+            "internaldate": _text(fields.get("INTERNALDATE")),
+            "headers": email.message_from_bytes(header_bytes),
+            "parts": body_parts(fields.get("BODYSTRUCTURE")),
+        }
+    return summaries
+
+
+def decode_transfer_encoding(data, encoding):
+    """Undo a part's Content-Transfer-Encoding."""
+    encoding = (encoding or "").lower()
+    if encoding == "base64":
+        try:
+            return base64.b64decode(_NON_BASE64.sub(b"", data) + b"==")
+        except (binascii.Error, ValueError) as e:
+            logger.warning(f"Could not decode base64 part: {e}")
+            return data
+    if encoding == "quoted-printable":
+        return quopri.decodestring(data)
+    return data
+
+
+def fetch_parts(mail, wanted):
+    """Phase two: download only the wanted parts ({uid: parts}) with BODY.PEEK[section].
+
+    Messages that need the same sections (the usual case for a run of
+    similar emails) share one UID FETCH. Returns {uid: {section: decoded
+    bytes}}; UIDs whose FETCH failed map to None. PEEK leaves the \\Seen
+    flag alone, as fetching RFC822 would not.
+    """
+    groups = {}
+    for uid, parts in wanted.items():
+        if parts:
+            groups.setdefault(tuple(part["section"] for part in parts), []).append(uid)
+
+    results = {uid: {} for uid in wanted}
+    for sections, uids in groups.items():
+        items = " ".join(f"BODY.PEEK[{section}]" for section in sections)
+        status, data = mail.uid("FETCH", compact_uid_set(uids), f"({items})")
+        if status != "OK":
+            print(f"❌ Part fetch failed for {len(uids)} message(s): {data}")
+            results.update(dict.fromkeys(uids))
+            continue
+
+        fetched = parse_fetch_response(data)
+        for uid in uids:
+            fields = fetched.get(int(uid), {})
+            for part in wanted[uid]:
+                raw = fields.get(f"BODY[{part['section']}]")
+                if isinstance(raw, bytes):
+                    results[uid][part["section"]] = decode_transfer_encoding(bytes(raw), part["encoding"])
+    return results
+
+
+class _StreamDecoder:
+    """Undo a Content-Transfer-Encoding one chunk at a time."""
+
+    def __init__(self, encoding):
+        """Start decoding a part with the given transfer encoding."""
+        self.encoding = (encoding or "").lower()
+        self._pending = b""
+
+    def feed(self, data):
+        """Return the decoded bytes of data, holding back an incomplete base64 quantum or QP line."""
+        if self.encoding == "base64":
+            data = self._pending + _NON_BASE64.sub(b"", data)
+            usable = len(data) - len(data) % 4
+            self._pending = data[usable:]
+            return decode_transfer_encoding(data[:usable], "base64") if usable else b""
+        if self.encoding == "quoted-printable":
+            data = self._pending + data
+            cut = data.rfind(b"\n") + 1
+            self._pending = data[cut:]
+            return quopri.decodestring(data[:cut])
+        return data
+
+    def finish(self):
+        """Return whatever was held back."""
+        pending, self._pending = self._pending, b""
+        return decode_transfer_encoding(pending, self.encoding) if pending else b""
+
+
+class _SpoolFile:
+    """A part decoded into a temporary file and hashed on the way, renamed after its SHA-256 when done."""
+
+    def __init__(self, directory, encoding):
+        """Open a temporary file in directory for a part with the given transfer encoding."""
+        self.directory = directory
+        self.size = 0
+        self._decoder = _StreamDecoder(encoding)
+        self._hash = hashlib.sha256()
+        fd, self._temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+
+    def _write_decoded(self, data):
+        """Append decoded bytes to the file and the hash."""
+        if data:
+            self._file.write(data)
+            self._hash.update(data)
+            self.size += len(data)
+
+    def write(self, data):
+        """Decode and append a chunk of the encoded part."""
+        self._write_decoded(self._decoder.feed(data))
+
+    def finish(self):
+        """Close the file, move it to directory/<sha256> and return {"path", "sha256", "size"}."""
+        self._write_decoded(self._decoder.finish())
+        self._file.close()
+        digest = self._hash.hexdigest()
+        path = os.path.join(self.directory, digest)
+        # Identical content may already be spooled; replacing it with the same bytes is harmless
+        os.replace(self._temp_path, path)
+        return {"path": path, "sha256": digest, "size": self.size}
+
+    def abort(self):
+        """Close and delete the unfinished file."""
+        self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            pass
+
+
+def _spool_whole(mail, section, batch, directory, results):
+    """Fetch the same section of several messages in one UID FETCH and spool each part."""
+    uids = [uid for uid, _ in batch if results.get(uid) is not None]
+    if not uids:
+        return
+    status, data = mail.uid("FETCH", compact_uid_set(uids), f"(BODY.PEEK[{section}])")
+    if status != "OK":
+        print(f"❌ Attachment fetch failed for {len(uids)} message(s): {data}")
+        results.update(dict.fromkeys(uids))
+        return
+    fetched = parse_fetch_response(data)
+    del data
+    for uid, part in batch:
+        raw = fetched.get(uid, {}).get(f"BODY[{section}]")
+        if results.get(uid) is None or not isinstance(raw, bytes):
+            continue
+        spool = _SpoolFile(directory, part["encoding"])
+        try:
+            spool.write(raw)
+            results[uid][section] = spool.finish()
+        except Exception:
+            spool.abort()
+            raise
+
+
+def _spool_chunked(mail, uid, part, directory, chunk_size, results):
+    """Fetch one large part chunk_size bytes at a time with partial BODY.PEEK[section]<offset.length> fetches."""
+    section = part["section"]
+    spool = _SpoolFile(directory, part["encoding"])
+    offset = 0
+    try:
+        while True:
+            status, data = mail.uid("FETCH", str(uid), f"(BODY.PEEK[{section}]<{offset}.{chunk_size}>)")
+            if status != "OK":
+                print(f"❌ Attachment fetch failed for message UID {uid} at offset {offset}: {data}")
+                spool.abort()
+                results[uid] = None
+                return
+            fields = parse_fetch_response(data).get(uid, {})
+            raw = fields.get(f"BODY[{section}]<{offset}>", fields.get(f"BODY[{section}]"))
+            raw = raw if isinstance(raw, bytes) else b""
+            spool.write(raw)
+            offset += len(raw)
+            if len(raw) < chunk_size:
+                break
+        results[uid][section] = spool.finish()
+    except Exception:
+        spool.abort()
+        raise
+
+
+def spool_parts(mail, wanted, directory, chunk_size=IMAP_FETCH_CHUNK):
+    """Download the wanted attachment parts ({uid: parts}) into content-addressed files in directory.
+
+    Parts are decoded and hashed as they arrive, so memory use stays around
+    chunk_size whatever the attachment size. Parts no bigger than chunk_size
+    that share a section number are fetched together, up to chunk_size of
+    encoded data per UID FETCH; bigger ones are fetched chunk_size at a time.
+    Returns {uid: {section: {"path", "sha256", "size"}}}; UIDs whose fetch
+    failed map to None.
+    """
+    os.makedirs(directory, exist_ok=True)
+    results = {uid: {} for uid in wanted}
+    small, large = {}, []
+    for uid, parts in wanted.items():
+        for part in parts:
+            if 0 < part["size"] <= chunk_size:
+                small.setdefault(part["section"], []).append((uid, part))
+            else:
+                large.append((uid, part))
+
+    for section, items in small.items():
+        batch, batch_bytes = [], 0
+        for uid, part in items:
+            if batch and batch_bytes + part["size"] > chunk_size:
+                _spool_whole(mail, section, batch, directory, results)
+                batch, batch_bytes = [], 0
+            batch.append((uid, part))
+            batch_bytes += part["size"]
+        _spool_whole(mail, section, batch, directory, results)
+
+    for uid, part in large:
+        if results.get(uid) is not None:
+            _spool_chunked(mail, uid, part, directory, chunk_size, results)
+    return results
+
+
+def _fetch_batch(mail, uids, select, spool_dir):
+    """Fetch summaries and the selected parts for one batch of UIDs; return [(uid, summary, contents)]."""
+    summaries = fetch_summaries(mail, uids)
+    if summaries is None:
+        return [(uid, None, None) for uid in uids]
+    wanted = {uid: select(summaries[uid]) for uid in uids if uid in summaries}
+    if spool_dir is None:
+        contents = fetch_parts(mail, wanted)
+    else:
+        inline = {uid: [part for part in parts if part["disposition"] != "attachment"] for uid, parts in wanted.items()}
+        attached = {uid: [part for part in parts if part["disposition"] == "attachment"] for uid, parts in wanted.items()}
+        contents = fetch_parts(mail, inline)
+        for uid, files in spool_parts(mail, attached, spool_dir).items():
+            contents[uid] = None if files is None or contents.get(uid) is None else {**contents[uid], **files}
+    return [(uid, summaries.get(uid), contents.get(uid, {})) for uid in uids]
+
+
+def prefetch_messages(mail, uids, select, batch_size=IMAP_FETCH_BATCH, depth=IMAP_PREFETCH_BATCHES, spool_dir=None):
+    """Yield (uid, summary, contents) for uids in order, fetching ahead in a background thread.
+
+    The thread owns the connection until the generator is exhausted or
+    closed, so the caller must not use mail while iterating. Each batch
+    costs two round trips: one UID FETCH for the summaries of up to
+    batch_size messages, then one per distinct set of parts chosen by
+    select(summary). At most depth batches wait while the caller works
+    through the current one. summary is None if the message is gone;
+    contents is None if its fetch failed and {} if select wanted nothing.
+    With spool_dir, attachment parts are streamed to files there by
+    spool_parts and contents holds their {"path", "sha256", "size"}
+    instead of the bytes.
+    """
+    batches = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for start in range(0, len(uids), batch_size):
+                if stop.is_set():
+                    return
+                batches.put(_fetch_batch(mail, uids[start:start + batch_size], select, spool_dir))
+        except Exception as e:
+            batches.put(e)
+        finally:
+            batches.put(_DONE)
+
+    thread = threading.Thread(target=produce, name="imap-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            yield from batch
+    finally:
+        stop.set()
+        # Unblock a producer waiting on a full queue, then wait for it to let go of the connection
+        while thread.is_alive():
+            try:
+                batches.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def decode_text(data, part):
+    """Decode a text part's bytes using its charset parameter."""
+    charset = part["params"].get("charset") or "utf-8"
+    try:
+        return data.decode(charset, errors="ignore")
+    except LookupError:
+        return data.decode("latin-1", errors="ignore")
@@ -0,0 +1,76 @@
+"""IMAP IDLE (RFC 2177) and NOOP polling used to wait for new mail in daemon mode."""
+
+import imaplib
+import re
+import select
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_NEW_MAIL = re.compile(rb"^\* \d+ (EXISTS|RECENT)\b", re.IGNORECASE)
+
+
+def supports_idle(mail):
+    """Return True if the server advertised the IDLE capability."""
+    return "IDLE" in (capability.upper() for capability in mail.capabilities)
+
+
+def _readable(mail, timeout):
+    """Wait up to timeout seconds for data on the connection."""
+    # TLS may already hold decrypted bytes that select cannot see
+    pending = getattr(mail.sock, "pending", None)
+    if pending and pending():
+        return True
+    return bool(select.select([mail.sock], [], [], timeout)[0])
+
+
+def idle(mail, timeout):
+    """Wait in IDLE on the selected folder; return True once the server reports new mail, False after timeout.
+
+    imaplib (before Python 3.14) has no IDLE command, so it is sent by hand
+    with the connection's own tag counter and the responses are read line by
+    line until DONE is acknowledged. timeout should stay below the 29 minutes
+    after which servers may drop an idle connection.
+    """
+    tag = mail._new_tag()
+    mail.tagged_commands.pop(tag, None)
+    mail.send(tag + b" IDLE\r\n")
+    line = mail.readline()
+    if not line.startswith(b"+"):
+        raise imaplib.IMAP4.error(f"IDLE rejected: {line.strip()!r}")
+
+    new_mail = False
+    deadline = time.monotonic() + timeout
+    while not new_mail:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not _readable(mail, remaining):
+            break
+        line = mail.readline()
+        if line.startswith(b"* BYE"):
+            raise imaplib.IMAP4.abort(f"Server closed the connection: {line.strip()!r}")
+        new_mail = bool(_NEW_MAIL.match(line))
+
+    mail.send(b"DONE\r\n")
+    while not line.startswith(tag):
+        line = mail.readline()
+        if line.startswith(b"* BYE"):
+            raise imaplib.IMAP4.abort(f"Server closed the connection: {line.strip()!r}")
+        new_mail = new_mail or bool(_NEW_MAIL.match(line))
+    if line.split()[1:2] != [b"OK"]:
+        raise imaplib.IMAP4.error(f"IDLE failed: {line.strip()!r}")
+    return new_mail
+
+
+def poll(mail):
+    """Send NOOP and return True if the server reported new mail since the last check."""
+    status, data = mail.noop()
+    if status != "OK":
+        raise imaplib.IMAP4.abort(f"NOOP failed: {data}")
+    return any(mail.response(name)[1][0] is not None for name in ("EXISTS", "RECENT"))
+
+
+def clear_notifications(mail):
+    """Drop EXISTS/RECENT responses collected so far (e.g. during a sweep) so the next poll only sees new ones."""
+    for name in ("EXISTS", "RECENT"):
+        mail.response(name)
@@ -0,0 +1,125 @@
+"""Pool of logged-in IMAP connections per account, with the account's folder listing cached per run."""
+
+import imaplib
+import queue
+import re
+import threading
+import logging
+from contextlib import contextmanager
+from data_ingestion.config import IMAP_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+_LIST_LINE = re.compile(rb'^\((?P<flags>[^)]*)\) (?P<delimiter>"[^"]*"|NIL) (?P<name>.+)$')
+
+
+def list_folders(mail):
+    """Return the names of all folders of the account."""
+    status, data = mail.list()
+    if status != "OK":
+        raise imaplib.IMAP4.error(f"Failed to list folders: {data}")
+    folders = []
+    for line in data:
+        match = _LIST_LINE.match(line) if isinstance(line, bytes) else None
+        if match:
+            name = match.group("name").decode(errors="replace")
+            folders.append(name[1:-1] if name.startswith('"') and name.endswith('"') else name)
+    return folders
+
+
+def ensure_folder(mail, name, folders):
+    """Create folder name unless it is in the folders listing (which is updated)."""
+    if name in folders:
+        return
+    print(f"📁 Creating folder: {name}")
+    status, data = mail.create(name)
+    if status != "OK":
+        # Processing continues, but emails cannot be moved there
+        print(f"❌ Failed to create folder {name}: {data}")
+        return
+    folders.append(name)
+    print(f"✅ Folder {name} created successfully")
+
+
+class IMAPConnectionPool:
+    """Up to size logged-in connections to one account, each used by one thread at a time.
+
+    Connections are opened lazily and reused; one that fails with a
+    connection error is dropped and replaced by a fresh one on next use.
+    """
+
+    def __init__(self, account, size=IMAP_POOL_SIZE):
+        """Create an empty pool for account, a dict with email, password and imap_server."""
+        self.account = account
+        self.size = size
+        self._slots = threading.BoundedSemaphore(size)
+        self._free = queue.LifoQueue()
+        self._open = []
+        self._lock = threading.Lock()
+        self._folders = None
+
+    @property
+    def name(self):
+        """The account's email address."""
+        return self.account["email"]
+
+    def _connect(self):
+        """Open and log in a new connection."""
+        mail = imaplib.IMAP4_SSL(self.account["imap_server"])
+        mail.login(self.account["email"], self.account["password"])
+        with self._lock:
+            self._open.append(mail)
+        return mail
+
+    def _discard(self, mail):
+        """Forget and close a broken connection."""
+        with self._lock:
+            if mail in self._open:
+                self._open.remove(mail)
+        try:
+            mail.shutdown()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, blocking while all size connections are in use."""
+        self._slots.acquire()
+        mail = None
+        try:
+            try:
+                mail = self._free.get_nowait()
+            except queue.Empty:
+                mail = self._connect()
+            yield mail
+        except (imaplib.IMAP4.abort, OSError):
+            if mail is not None:
+                self._discard(mail)
+                mail = None
+            raise
+        finally:
+            if mail is not None:
+                self._free.put(mail)
+            self._slots.release()
+
+    def folders(self):
+        """Return the account's folder names, listed once per pool."""
+        with self._lock:
+            if self._folders is not None:
+                return self._folders
+        with self.connection() as mail:
+            folders = list_folders(mail)
+        with self._lock:
+            if self._folders is None:
+                self._folders = folders
+            return self._folders
+
+    def close(self):
+        """Log out every connection of the pool."""
+        with self._lock:
+            connections, self._open = self._open, []
+        for mail in connections:
+            try:
+                mail.logout()
+            except Exception:
+                pass
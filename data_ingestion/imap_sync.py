@@ -0,0 +1,180 @@
+"""UID-based incremental IMAP sync: remembers UIDVALIDITY and the highest processed UID per folder."""
+
+import re
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folder_sync (
+    folder TEXT PRIMARY KEY,
+    uidvalidity INTEGER NOT NULL,
+    last_uid INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class SyncState:
+    """Per-folder (UIDVALIDITY, last processed UID) pairs stored in SQLite."""
+
+    def __init__(self, path):
+        """Open (creating if needed) the sync state database at path."""
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, folder):
+        """Return (uidvalidity, last_uid) for folder, or None if it was never synced."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uidvalidity, last_uid FROM folder_sync WHERE folder = ?", (folder,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def reset(self, folder, uidvalidity):
+        """Start tracking folder under a new UIDVALIDITY with nothing processed."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO folder_sync (folder, uidvalidity, last_uid, updated_at) VALUES (?, ?, 0, ?)",
+                (folder, uidvalidity, time.time()),
+            )
+
+    def advance(self, folder, uidvalidity, uid):
+        """Record uid as processed; the stored UID only ever moves forward."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE folder_sync SET last_uid = MAX(last_uid, ?), updated_at = ? WHERE folder = ? AND uidvalidity = ?",
+                (int(uid), time.time(), folder, uidvalidity),
+            )
+
+
+def get_uidvalidity(mail, folder):
+    """Return the UIDVALIDITY of the selected folder."""
+    _, data = mail.response("UIDVALIDITY")
+    if not data or data[0] is None:
+        _, data = mail.status(folder, "(UIDVALIDITY)")
+        match = re.search(rb"UIDVALIDITY (\d+)", data[0] or b"")
+        return int(match.group(1)) if match else None
+    return int(data[-1])
+
+
+def parse_uids(data):
+    """Return the UIDs of a UID SEARCH response as sorted ints."""
+    if not data or not data[0]:
+        return []
+    return sorted(int(uid) for uid in data[0].split())
+
+
+def sync_folder(mail, folder, state, since_date=None, key=None):
+    """Return (uidvalidity, uids) for messages in the selected folder that were never processed.
+
+    Normally this is a UID SEARCH for everything above the last processed
+    UID. If the folder was never synced or its UIDVALIDITY changed (the
+    server renumbered it), the stored UID is meaningless, so the folder is
+    resynced: everything since since_date (or the whole folder) is returned
+    and the state is reset under the new UIDVALIDITY. The state is kept
+    under key (default: the folder name).
+    """
+    key = key or folder
+    uidvalidity = get_uidvalidity(mail, folder)
+    stored = state.get(key)
+
+    if stored is None or stored[0] != uidvalidity:
+        if stored is not None:
+            print(f"🔄 UIDVALIDITY of {folder} changed ({stored[0]} -> {uidvalidity}), resyncing")
+        criteria = f'(SINCE "{since_date}")' if since_date else "ALL"
+        status, data = mail.uid("SEARCH", None, criteria)
+        if status != "OK":
+            raise RuntimeError(f"UID SEARCH {criteria} failed in {folder}: {data}")
+        state.reset(key, uidvalidity)
+        uids = parse_uids(data)
+        print(f"🔍 Full sync of {folder} ({criteria}): {len(uids)} message(s)")
+        return uidvalidity, uids
+
+    last_uid = stored[1]
+    status, data = mail.uid("SEARCH", None, f"UID {last_uid + 1}:*")
+    if status != "OK":
+        raise RuntimeError(f"UID SEARCH failed in {folder}: {data}")
+    # "n:*" always matches the newest message, even when its UID is below n
+    uids = [uid for uid in parse_uids(data) if uid > last_uid]
+    print(f"🔍 {folder}: {len(uids)} new message(s) after UID {last_uid}")
+    return uidvalidity, uids
+
+
+def has_new_messages(mail, folder, state, key=None):
+    """Return True if the selected folder has messages sync_folder would return (one UID SEARCH)."""
+    stored = state.get(key or folder)
+    if stored is None or stored[0] != get_uidvalidity(mail, folder):
+        return True
+    status, data = mail.uid("SEARCH", None, f"UID {stored[1] + 1}:*")
+    if status != "OK":
+        raise RuntimeError(f"UID SEARCH failed in {folder}: {data}")
+    return any(uid > stored[1] for uid in parse_uids(data))
+
+
+def find_uids_by_message_id(mail, message_id):
+    """Return the UIDs of the selected folder's messages whose Message-ID header is message_id."""
+    quoted = message_id.replace("\\", "\\\\").replace('"', '\\"')
+    status, data = mail.uid("SEARCH", None, f'HEADER Message-ID "{quoted}"')
+    if status != "OK":
+        raise RuntimeError(f"UID SEARCH by Message-ID failed: {data}")
+    return parse_uids(data)
+
+
+def compact_uid_set(uids):
+    """Return uids as a compact IMAP sequence set, e.g. [1, 2, 3, 7] -> "1:3,7"."""
+    ranges = []
+    for uid in sorted({int(uid) for uid in uids}):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(str(start) if start == end else f"{start}:{end}" for start, end in ranges)
+
+
+def has_capability(mail, name):
+    """Return True if the server advertised capability name."""
+    return name.upper() in (capability.upper() for capability in getattr(mail, "capabilities", ()))
+
+
+def move_messages(mail, uids, destination):
+    """Mark uids of the selected folder \\Seen and move them to destination in bulk; return True on success.
+
+    Uses UID MOVE (RFC 6851) when the server advertises it. Otherwise falls
+    back to UID COPY plus one UID STORE of \\Deleted and a single expunge,
+    which is a UID EXPUNGE of just these messages when UIDPLUS is available.
+    """
+    if not uids:
+        return True
+    uid_set = compact_uid_set(uids)
+    status, data = mail.uid("STORE", uid_set, "+FLAGS", "(\\Seen)")
+    if status != "OK":
+        print(f"⚠️ Failed to flag {len(uids)} email(s) as seen: {data}")
+
+    if has_capability(mail, "MOVE"):
+        status, data = mail.uid("MOVE", uid_set, destination)
+        if status != "OK":
+            print(f"⚠️ Failed to move {len(uids)} email(s) to {destination}: {data}")
+            return False
+        print(f"📁 Moved {len(uids)} email(s) to {destination}")
+        return True
+
+    status, data = mail.uid("COPY", uid_set, destination)
+    if status != "OK":
+        print(f"⚠️ Failed to copy {len(uids)} email(s) to {destination}: {data}")
+        return False
+    status, data = mail.uid("STORE", uid_set, "+FLAGS", "(\\Deleted)")
+    if status != "OK":
+        print(f"⚠️ Copied {len(uids)} email(s) to {destination} but could not mark them deleted: {data}")
+        return False
+    if has_capability(mail, "UIDPLUS"):
+        mail.uid("EXPUNGE", uid_set)
+    else:
+        mail.expunge()
+    print(f"📁 Moved {len(uids)} email(s) to {destination} and expunged them")
+    return True
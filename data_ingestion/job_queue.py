@@ -0,0 +1,236 @@
+"""Durable SQLite (WAL) job queue recording the stage each ingestion job has reached."""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+READY = "ready"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_key TEXT NOT NULL UNIQUE,
+    folder TEXT,
+    stage TEXT NOT NULL DEFAULT 'queued',
+    status TEXT NOT NULL DEFAULT 'ready',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    visible_at REAL NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claimable ON jobs (status, folder, visible_at);
+"""
+
+
+def _worker_id():
+    """Identify this process as host:pid."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(worker_id):
+    """Return False only if worker_id is a process on this host that no longer exists."""
+    host, _, pid = (worker_id or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """Jobs keyed by an idempotency key, claimed with a visibility timeout and retried on failure.
+
+    A claimed job is invisible to other claims until its visibility timeout
+    passes or the process holding it is found dead, so a restarted worker
+    picks up whatever its predecessor left half done. Each job keeps the
+    last stage it completed and a JSON payload with its intermediate results.
+    """
+
+    def __init__(self, path, visibility_timeout=1800, max_attempts=5, retry_delay=60):
+        """Open (creating if needed) the queue database at path."""
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.worker_id = _worker_id()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _row_to_job(self, row):
+        """Return a job row as a dict with the payload decoded."""
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def enqueue(self, job_key, payload, folder=None):
+        """Add a job unless one with job_key already exists; return (job_id, created)."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_key, folder, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_key, folder, json.dumps(payload), now, now),
+            )
+            if cursor.rowcount:
+                return cursor.lastrowid, True
+            row = self._conn.execute("SELECT id FROM jobs WHERE job_key = ?", (job_key,)).fetchone()
+            return row["id"], False
+
+    def find(self, job_key):
+        """Return the job with job_key, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_key = ?", (job_key,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def get(self, job_id):
+        """Return a job by id, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self, folder=None, job_id=None, limit=None):
+        """Claim ready jobs (and claimed jobs whose visibility timeout expired or whose owner died).
+
+        Optionally restricted to one folder or one job id. Returns the claimed
+        jobs, oldest first, each with its attempt counter already incremented.
+        """
+        now = time.time()
+        query = "SELECT * FROM jobs WHERE status IN (?, ?) AND attempts < ?"
+        params = [READY, CLAIMED, self.max_attempts]
+        if folder is not None:
+            query += " AND folder = ?"
+            params.append(folder)
+        if job_id is not None:
+            query += " AND id = ?"
+            params.append(job_id)
+        query += " ORDER BY id"
+
+        claimed = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for row in self._conn.execute(query, params).fetchall():
+                    if limit is not None and len(claimed) >= limit:
+                        break
+                    if row["visible_at"] > now and (row["status"] == READY or _owner_alive(row["claimed_by"])):
+                        continue
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, claimed_by = ?, visible_at = ?, attempts = attempts + 1, "
+                        "updated_at = ? WHERE id = ?",
+                        (CLAIMED, self.worker_id, now + self.visibility_timeout, now, row["id"]),
+                    )
+                    job = self._row_to_job(row)
+                    job.update(status=CLAIMED, claimed_by=self.worker_id, attempts=row["attempts"] + 1)
+                    claimed.append(job)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def exhausted(self, folder=None):
+        """Return claimed jobs with no attempts left whose claim expired or whose owner died.
+
+        claim() never takes these, so the caller fails them; otherwise they
+        would stay claimed forever.
+        """
+        now = time.time()
+        query = "SELECT * FROM jobs WHERE status = ? AND attempts >= ?"
+        params = [CLAIMED, self.max_attempts]
+        if folder is not None:
+            query += " AND folder = ?"
+            params.append(folder)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._row_to_job(row) for row in rows
+                if row["visible_at"] <= now or not _owner_alive(row["claimed_by"])]
+
+    def advance(self, job_id, stage, payload=None):
+        """Record that a claimed job finished stage, saving its payload and extending the claim."""
+        now = time.time()
+        with self._lock:
+            if payload is None:
+                self._conn.execute(
+                    "UPDATE jobs SET stage = ?, visible_at = ?, updated_at = ? WHERE id = ? AND status = ?",
+                    (stage, now + self.visibility_timeout, now, job_id, CLAIMED),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET stage = ?, payload = ?, visible_at = ?, updated_at = ? WHERE id = ? AND status = ?",
+                    (stage, json.dumps(payload), now + self.visibility_timeout, now, job_id, CLAIMED),
+                )
+
+    def complete(self, job_id):
+        """Mark a job done; completing an already finished job is a no-op."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, claimed_by = NULL, last_error = NULL, updated_at = ? "
+                "WHERE id = ? AND status != ?",
+                (DONE, DONE, time.time(), job_id, DONE),
+            )
+
+    def fail(self, job_id, error):
+        """Record a failed attempt; the job is retried after retry_delay until max_attempts is reached.
+
+        Returns the job's new status (FAILED once it will not be retried), or None if it was already done.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT attempts, status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row["status"] == DONE:
+                return None
+            status = FAILED if row["attempts"] >= self.max_attempts else READY
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, claimed_by = NULL, visible_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (status, now + self.retry_delay, str(error), now, job_id),
+            )
+        if status == FAILED:
+            logger.error(f"Job {job_id} failed permanently after {row['attempts']} attempt(s): {error}")
+        return status
+
+    def next_visible_at(self, folder=None):
+        """Return the earliest time an unfinished job (optionally of one folder) can be claimed, or None."""
+        query = "SELECT MIN(visible_at) FROM jobs WHERE status IN (?, ?) AND attempts < ?"
+        params = [READY, CLAIMED, self.max_attempts]
+        if folder is not None:
+            query += " AND folder = ?"
+            params.append(folder)
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def references(self, text, exclude_id=None):
+        """Return True if the payload of an unfinished job (other than exclude_id) contains text."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE status IN (?, ?) AND id != ? AND instr(payload, ?) > 0 LIMIT 1",
+                (READY, CLAIMED, exclude_id if exclude_id is not None else -1, text),
+            ).fetchone()
+        return row is not None
+
+    def stats(self):
+        """Return job counts by status and, for unfinished jobs, by stage."""
+        with self._lock:
+            by_status = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            by_stage = dict(self._conn.execute(
+                "SELECT stage, COUNT(*) FROM jobs WHERE status IN (?, ?) GROUP BY stage", (READY, CLAIMED)
+            ).fetchall())
+        return {"status": by_status, "unfinished_stage": by_stage}
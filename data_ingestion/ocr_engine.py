@@ -0,0 +1,182 @@
+"""Process-wide warm OCR engine shared by every extraction path."""
+
+import atexit
+import gc
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+import fitz
+import numpy as np
+from data_ingestion.config import (
+    OCR_LANGUAGES, OCR_USE_GPU, OCR_DPI, OCR_GRAYSCALE, OCR_MODE, OCR_MAX_WORKERS, OCR_DOC_TIMEOUT,
+    PROCESS_START_METHOD
+)
+
+logger = logging.getLogger(__name__)
+
+_reader = None
+_reader_lock = threading.Lock()
+_model_loads = 0
+_executor = None
+_executor_lock = threading.Lock()
+_mode = OCR_MODE
+
+
+def _load_reader():
+    """Load the EasyOCR detection and recognition models."""
+    global _model_loads
+    import easyocr
+
+    logger.info(f"Loading EasyOCR models (languages={OCR_LANGUAGES}, gpu={OCR_USE_GPU})...")
+    reader = easyocr.Reader(OCR_LANGUAGES, gpu=OCR_USE_GPU)
+    _model_loads += 1
+    logger.info(f"EasyOCR models loaded (load #{_model_loads} in this process)")
+    return reader
+
+
+def get_reader():
+    """Return the warm OCR reader for this process, loading it on first use."""
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                _reader = _load_reader()
+    return _reader
+
+
+def init_ocr_engine():
+    """Warm the OCR reader ahead of time.
+
+    Call this before a gunicorn fork (``--preload``) so the model weights are
+    shared copy-on-write between workers, or from a worker initializer.
+    """
+    return get_reader()
+
+
+def use_serial_ocr():
+    """Run OCR inside this process from now on, never in the OCR worker pool.
+
+    Used as the initializer of worker processes that already do extraction
+    in parallel, so they do not each start a nested OCR pool.
+    """
+    global _mode
+    _mode = "serial"
+
+
+def shutdown_ocr_engine():
+    """Stop the OCR worker pool, drop the warm OCR reader and release its memory."""
+    global _reader, _executor
+    with _executor_lock:
+        if _executor is not None:
+            logger.info("Shutting down OCR worker pool")
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+    with _reader_lock:
+        if _reader is not None:
+            logger.info("Releasing EasyOCR reader")
+            _reader = None
+            gc.collect()
+
+
+def get_model_load_count():
+    """Return how many times the OCR models have been loaded in this process."""
+    return _model_loads
+
+
+def ocr_image(image_np):
+    """Run OCR on a page image and return the recognised text."""
+    results = get_reader().readtext(image_np)
+    return ' '.join([result[1] for result in results])
+
+
+def _get_executor():
+    """Return the bounded OCR process pool, starting it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                logger.info(f"Starting OCR worker pool with {OCR_MAX_WORKERS} process(es)")
+                _executor = ProcessPoolExecutor(max_workers=OCR_MAX_WORKERS, initializer=init_ocr_engine,
+                                                mp_context=multiprocessing.get_context(PROCESS_START_METHOD))
+    return _executor
+
+
+def render_page(page, dpi=OCR_DPI, grayscale=OCR_GRAYSCALE):
+    """Render a fitz page straight from its pixmap buffer to a numpy array."""
+    zoom = dpi / 72
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, alpha=False)
+    image = np.frombuffer(pix.samples, dtype=np.uint8)
+    if pix.n == 1:
+        return image.reshape(pix.height, pix.width)
+    return image.reshape(pix.height, pix.width, pix.n)
+
+
+def iter_page_images(doc, page_numbers, dpi=OCR_DPI, grayscale=OCR_GRAYSCALE):
+    """Yield (page number, image) for the given 1-based pages, one page at a time."""
+    for page_num in page_numbers:
+        image = render_page(doc[page_num - 1], dpi=dpi, grayscale=grayscale)
+        yield page_num, image
+        del image
+
+
+def open_pdf(source):
+    """Open a PDF from a file path or from in-memory bytes."""
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _ocr_pdf_page(source, page_num, dpi, grayscale):
+    """Rasterise one PDF page and OCR it (runs in a pool worker)."""
+    with open_pdf(source) as doc:
+        image = render_page(doc[page_num - 1], dpi=dpi, grayscale=grayscale)
+    return ocr_image(image)
+
+
+def ocr_pdf_pages(source, page_numbers, mode=None, timeout=None, dpi=OCR_DPI, grayscale=OCR_GRAYSCALE):
+    """OCR the given 1-based pages of a PDF and return a dict of page number to text.
+
+    The PDF may be given as a file path or as bytes.
+
+    In "process" mode pages are spread across the bounded worker pool, each
+    worker holding its own warm reader. Pages that do not finish within
+    timeout seconds (OCR_DOC_TIMEOUT by default; callers OCR-ing a document
+    in several calls pass the time left of its deadline) are left out of the
+    result. Only this call's pending pages are cancelled: the pool is shared
+    with other documents, so pages already running are left to finish. In
+    serial mode no page is started once the deadline has passed.
+    """
+    mode = mode or _mode
+    timeout = OCR_DOC_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    page_texts = {}
+
+    if mode != "process" or len(page_numbers) < 2:
+        with open_pdf(source) as doc:
+            for page_num, image in iter_page_images(doc, page_numbers, dpi=dpi, grayscale=grayscale):
+                if time.monotonic() >= deadline:
+                    logger.warning(f"OCR timed out after {timeout:.0f}s before page {page_num}")
+                    break
+                logger.info(f"Processing page {page_num} with OCR...")
+                page_texts[page_num] = ocr_image(image)
+        return page_texts
+
+    logger.info(f"Processing pages {page_numbers} with OCR across the worker pool...")
+    executor = _get_executor()
+    if isinstance(source, memoryview):
+        source = source.tobytes()
+    futures = {executor.submit(_ocr_pdf_page, source, page_num, dpi, grayscale): page_num for page_num in page_numbers}
+    done, not_done = wait(futures, timeout=timeout)
+
+    for future in not_done:
+        future.cancel()
+        logger.warning(f"OCR timed out after {timeout:.0f}s on page {futures[future]}")
+    for future in done:
+        page_texts[futures[future]] = future.result()
+    return page_texts
+
+
+atexit.register(shutdown_ocr_engine)
@@ -0,0 +1,323 @@
+"""Staged processing pipeline with a worker pool per stage and bounded queues between stages."""
+
+import asyncio
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from data_ingestion.config import PIPELINE_QUEUE_SIZE, PIPELINE_STATS_INTERVAL, PROCESS_START_METHOD
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ProcessPool:
+    """A process pool that outlives pipelines and is restarted when a worker dies.
+
+    Pass one to several Stage objects (or pipelines) so their workers, and
+    whatever they keep warm such as the OCR models, are shared and reused.
+    If a worker is killed (e.g. out of memory) the items it was running
+    fail, and the next item starts a fresh pool instead of failing too.
+    Workers are started with PROCESS_START_METHOD ("spawn" by default),
+    since the pool is started from pipeline threads.
+    """
+
+    def __init__(self, workers, initializer=None):
+        """Create a pool of up to workers processes, started on first use.
+
+        initializer, if given, runs once in each worker process as it starts.
+        """
+        self.workers = max(1, workers)
+        self.initializer = initializer
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        """Return the running executor, starting one if needed."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=self.initializer,
+                                                     mp_context=multiprocessing.get_context(PROCESS_START_METHOD))
+            return self._executor
+
+    def run(self, func, item):
+        """Run func(item) in a worker process and return its result."""
+        executor = self._get_executor()
+        try:
+            return executor.submit(func, item).result()
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    logger.warning("⚠️ A worker process died, restarting the process pool")
+                    self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    def shutdown(self):
+        """Stop the worker processes; the pool starts again if used afterwards."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+class Stage:
+    """One step of a Pipeline: a function and the kind of pool that runs it.
+
+    kind is "thread" for blocking I/O, "process" for CPU-bound work (func and
+    items must be picklable) or "async" for a coroutine function run as tasks
+    on the stage's own event loop. workers is the pool size, or the number of
+    concurrent tasks for async stages. A process stage runs on pool (a
+    ProcessPool) if given, otherwise on a pool of its own that lives as long
+    as the pipeline. func returns the item handed to the next stage, or None
+    to drop it.
+    """
+
+    KINDS = ("thread", "process", "async")
+
+    def __init__(self, name, func, kind="thread", workers=1, queue_size=None, pool=None):
+        """Describe a stage; queue_size overrides the pipeline default for its input queue."""
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown stage kind {kind!r}, expected one of {self.KINDS}")
+        self.name = name
+        self.func = func
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.pool = pool
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.in_flight = 0
+        self.busy_seconds = 0.0
+        self.started_at = None
+        self._lock = threading.Lock()
+
+    def _begin(self):
+        """Record that an item started."""
+        with self._lock:
+            self.in_flight += 1
+            if self.started_at is None:
+                self.started_at = time.monotonic()
+        return time.monotonic()
+
+    def _end(self, started, failed=False):
+        """Record that an item finished."""
+        with self._lock:
+            self.in_flight -= 1
+            self.busy_seconds += time.monotonic() - started
+            if failed:
+                self.failed += 1
+            else:
+                self.processed += 1
+
+
+class Pipeline:
+    """Run items through a chain of stages, each with its own workers.
+
+    Every stage reads from a bounded queue, so a slow stage makes the stages
+    before it (and finally submit) block instead of piling up work in memory.
+    Items a stage fails on are logged, passed to on_error(stage_name, item,
+    exception) if given, and dropped. on_progress(stage_name, result) is
+    called after every successful stage, e.g. to checkpoint the item. Output
+    of the last stage goes to on_result, or is collected and returned by join.
+    """
+
+    def __init__(self, stages, queue_size=PIPELINE_QUEUE_SIZE, on_result=None, on_error=None,
+                 on_progress=None, stats_interval=PIPELINE_STATS_INTERVAL):
+        """Create a pipeline; call start (or use it as a context manager) before submitting."""
+        self.stages = stages
+        self.on_result = on_result
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.stats_interval = stats_interval
+        self.results = []
+        self._queues = [queue.Queue(maxsize=stage.queue_size or queue_size) for stage in stages]
+        self._consumers = [1 if stage.kind == "async" else stage.workers for stage in stages]
+        self._remaining = list(self._consumers)
+        self._remaining_lock = threading.Lock()
+        self._threads = []
+        self._pools = {}
+        self._owned_pools = []
+        self._done = threading.Event()
+        self._results_lock = threading.Lock()
+        self._started_at = None
+
+    def __enter__(self):
+        """Start the pipeline."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        """Drain and stop the pipeline."""
+        self.join()
+
+    def start(self):
+        """Start the workers of every stage."""
+        self._started_at = time.monotonic()
+        for index, stage in enumerate(self.stages):
+            if stage.kind == "async":
+                self._spawn(f"{stage.name}-loop", lambda index=index: asyncio.run(self._run_async_stage(index)))
+                continue
+            if stage.kind == "process":
+                if stage.pool is None:
+                    self._owned_pools.append(ProcessPool(stage.workers))
+                self._pools[index] = stage.pool or self._owned_pools[-1]
+            for worker in range(stage.workers):
+                self._spawn(f"{stage.name}-{worker}", lambda index=index: self._run_worker(index))
+        if self.stats_interval:
+            monitor = threading.Thread(target=self._monitor, name="pipeline-stats", daemon=True)
+            monitor.start()
+
+    def submit(self, item):
+        """Queue an item for the first stage, blocking while that stage is full."""
+        self._queues[0].put(item)
+
+    def join(self):
+        """Signal that no more items will be submitted, wait for every stage to drain and return the results."""
+        for _ in range(self._consumers[0]):
+            self._queues[0].put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        for pool in self._owned_pools:
+            pool.shutdown()
+        self._done.set()
+        print(f"📊 Pipeline finished: {self.format_stats()}")
+        return self.results
+
+    def stats(self):
+        """Return queue depth, in-flight items, counts and throughput for each stage."""
+        now = time.monotonic()
+        stats = {}
+        for stage, stage_queue in zip(self.stages, self._queues):
+            with stage._lock:
+                elapsed = now - stage.started_at if stage.started_at else 0
+                stats[stage.name] = {
+                    "kind": stage.kind,
+                    "workers": stage.workers,
+                    "queued": stage_queue.qsize(),
+                    "in_flight": stage.in_flight,
+                    "processed": stage.processed,
+                    "failed": stage.failed,
+                    "dropped": stage.dropped,
+                    "per_second": round(stage.processed / elapsed, 2) if elapsed else 0.0,
+                    "utilisation": round(stage.busy_seconds / (elapsed * stage.workers), 2) if elapsed else 0.0,
+                }
+        return stats
+
+    def format_stats(self):
+        """Return the stage stats as one log line."""
+        return " | ".join(
+            f"{name}: queued={s['queued']} busy={s['in_flight']}/{s['workers']} done={s['processed']} "
+            f"failed={s['failed']} {s['per_second']}/s"
+            for name, s in self.stats().items()
+        )
+
+    def _spawn(self, name, target):
+        """Start and remember a worker thread."""
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _monitor(self):
+        """Log stage stats every stats_interval seconds until the pipeline finishes."""
+        while not self._done.wait(self.stats_interval):
+            print(f"📊 Pipeline: {self.format_stats()}")
+
+    def _emit(self, index, result):
+        """Hand a stage's output to the next stage, or to the results if it was the last one."""
+        stage = self.stages[index]
+        if result is None:
+            with stage._lock:
+                stage.dropped += 1
+            return
+        if self.on_progress:
+            try:
+                self.on_progress(stage.name, result)
+            except Exception as e:
+                logger.error(f"on_progress callback failed: {e}")
+        if index + 1 < len(self.stages):
+            self._queues[index + 1].put(result)
+        elif self.on_result:
+            self.on_result(result)
+        else:
+            with self._results_lock:
+                self.results.append(result)
+
+    def _fail(self, index, item, error):
+        """Log and report an item a stage could not process."""
+        stage = self.stages[index]
+        logger.error(f"❌ Pipeline stage {stage.name} failed: {error}", exc_info=error)
+        if self.on_error:
+            try:
+                self.on_error(stage.name, item, error)
+            except Exception as e:
+                logger.error(f"on_error callback failed: {e}")
+
+    def _consumer_done(self, index):
+        """Note that one consumer of a stage stopped; the last one stops the next stage."""
+        with self._remaining_lock:
+            self._remaining[index] -= 1
+            last = self._remaining[index] == 0
+        if last and index + 1 < len(self.stages):
+            for _ in range(self._consumers[index + 1]):
+                self._queues[index + 1].put(_STOP)
+
+    def _run_worker(self, index):
+        """Worker loop for thread and process stages."""
+        stage = self.stages[index]
+        stage_queue = self._queues[index]
+        while True:
+            item = stage_queue.get()
+            if item is _STOP:
+                break
+            started = stage._begin()
+            try:
+                if stage.kind == "process":
+                    result = self._pools[index].run(stage.func, item)
+                else:
+                    result = stage.func(item)
+            except Exception as e:
+                stage._end(started, failed=True)
+                self._fail(index, item, e)
+                continue
+            stage._end(started)
+            self._emit(index, result)
+        self._consumer_done(index)
+
+    async def _run_async_stage(self, index):
+        """Dispatcher for an async stage: run up to stage.workers items concurrently."""
+        stage = self.stages[index]
+        stage_queue = self._queues[index]
+        slots = asyncio.Semaphore(stage.workers)
+        tasks = set()
+
+        async def run_item(item):
+            started = stage._begin()
+            try:
+                result = await stage.func(item)
+            except Exception as e:
+                stage._end(started, failed=True)
+                self._fail(index, item, e)
+                return
+            finally:
+                slots.release()
+            stage._end(started)
+            # The next queue may be full; wait for it off the event loop
+            await asyncio.to_thread(self._emit, index, result)
+
+        while True:
+            item = await asyncio.to_thread(stage_queue.get)
+            if item is _STOP:
+                break
+            await slots.acquire()
+            task = asyncio.create_task(run_item(item))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        self._consumer_done(index)
@@ -0,0 +1,135 @@
+"""Deterministic pre-extraction of resume fields that do not need the LLM."""
+
+import re
+from data_ingestion.prompt_packer import segment_resume
+
+EMAIL_PATTERN = re.compile(r'(?<![\w.+-])[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}')
+PHONE_PATTERN = re.compile(r'(?<![\w+(])((?:\+\s?)?\(?\d[\d \t().-]{8,16}\d)(?!\w)')
+PHONE_LABEL_PATTERN = re.compile(r'\b(?:phone|mobile|mob|cell|tel|telephone|contact|ph)\b', re.IGNORECASE)
+# Aadhaar numbers are written as three groups of four digits
+ID_NUMBER_PATTERN = re.compile(r'^\d{4}[ -]\d{4}[ -]\d{4}$')
+ID_LABEL_PATTERN = re.compile(r'\b(?:aadha?ar|uid|pan|passport)\b', re.IGNORECASE)
+YEAR_PATTERN = re.compile(r'^(?:19|20)\d{2}$')
+LINKEDIN_PATTERN = re.compile(r'(?:https?://)?(?:[a-z]{2,3}\.)?linkedin\.com/in/[A-Za-z0-9_%-]+/?', re.IGNORECASE)
+DATE_LIKE_PATTERN = re.compile(r'^\d{1,4}[./-]\d{1,2}[./-]\d{1,4}$')
+
+# Canonical skill name -> extra spellings matched case-insensitively
+SKILLS = {
+    "Python": [], "Java": [], "JavaScript": [], "TypeScript": [], "C": [], "C++": ["cpp"],
+    "C#": ["csharp"], "Go": ["golang"], "Rust": [], "Kotlin": [], "Swift": [], "PHP": [], "Ruby": [],
+    "Scala": [], "R": [], "Dart": [], "Objective-C": [], "Perl": [], "Bash": ["shell scripting"],
+    "HTML": ["html5"], "CSS": ["css3"], "SASS": ["scss"], "Tailwind CSS": ["tailwind"], "Bootstrap": [],
+    "React": ["react.js", "reactjs"], "React Native": [], "Angular": ["angularjs", "angular.js"],
+    "Vue.js": ["vue", "vuejs"], "Next.js": ["nextjs"], "Redux": [], "jQuery": [],
+    "Node.js": ["node", "nodejs"], "Express.js": ["express", "expressjs"], "NestJS": [],
+    "Django": [], "Flask": [], "FastAPI": [], "Spring Boot": ["springboot"], "Spring": [], "Hibernate": [],
+    "Laravel": [], ".NET": ["dotnet", "asp.net"], "Ruby on Rails": ["rails"], "GraphQL": [], "REST API": ["rest apis", "restful"],
+    "Flutter": [], "Android": [], "iOS": [], "SwiftUI": [], "Xamarin": [], "Ionic": [],
+    "SQL": [], "MySQL": [], "PostgreSQL": ["postgres"], "SQLite": [], "Oracle": [], "SQL Server": ["mssql"],
+    "MongoDB": ["mongo"], "Redis": [], "Cassandra": [], "DynamoDB": [], "Elasticsearch": [], "Firebase": [],
+    "AWS": ["amazon web services"], "Azure": [], "GCP": ["google cloud"], "Docker": [], "Kubernetes": ["k8s"],
+    "Terraform": [], "Ansible": [], "Jenkins": [], "GitHub Actions": [], "GitLab CI": [], "CI/CD": [],
+    "Linux": [], "Git": [], "Nginx": [], "Kafka": [], "RabbitMQ": [], "Microservices": [],
+    "Spark": ["pyspark", "apache spark"], "Hadoop": [], "Airflow": [], "Snowflake": [], "Databricks": [],
+    "ETL": [], "Power BI": ["powerbi"], "Tableau": [], "Excel": [],
+    "Pandas": [], "NumPy": [], "Scikit-learn": ["sklearn"], "TensorFlow": [], "PyTorch": [], "Keras": [],
+    "OpenCV": [], "NLP": [], "Machine Learning": [], "Deep Learning": [], "LangChain": [], "LLM": ["llms"],
+    "Selenium": [], "Cypress": [], "Playwright": [], "Appium": [], "JMeter": [], "Postman": [],
+    "TestNG": [], "JUnit": [], "PyTest": [], "Cucumber": [], "Manual Testing": [], "Automation Testing": [],
+    "API Testing": [], "JIRA": [], "Agile": ["scrum"],
+    "Solidity": [], "Blockchain": [], "Web3": [], "Ethereum": [],
+    "Unity": [], "Unreal Engine": [], "Embedded C": [], "Arduino": [], "Raspberry Pi": [], "RTOS": [],
+    "Penetration Testing": [], "Wireshark": [], "Burp Suite": [], "SIEM": [],
+}
+
+_skill_lookup = {}
+for _canonical, _aliases in SKILLS.items():
+    for _spelling in [_canonical, *_aliases]:
+        _skill_lookup[_spelling.lower()] = _canonical
+
+# Longest spellings first so "React Native" wins over "React"
+SKILLS_PATTERN = re.compile(
+    r'(?<![\w+#./-])(' + '|'.join(re.escape(s) for s in sorted(_skill_lookup, key=len, reverse=True)) + r')(?![\w+#/-]|\.\w)',
+    re.IGNORECASE,
+)
+# Skills that are also ordinary words only count when written exactly like this
+CASE_SENSITIVE_SKILLS = {
+    "C", "R", "Go", "Swift", "Spring", "Unity", "Rust", "Ruby", "Dart", "Ionic",
+    "Express", "Node", "Spark", "Excel", "Oracle", "Agile", "Git",
+}
+_case_sensitive_lower = {skill.lower() for skill in CASE_SENSITIVE_SKILLS}
+
+
+def _contact_lines(text):
+    """Return the lines that may hold the candidate's phone number, most likely first.
+
+    These are the contact block before the first section heading, then any
+    line labelled as a phone number elsewhere (e.g. a contact footer).
+    """
+    sections = segment_resume(text)
+    header = sections[0][1].splitlines() if sections and sections[0][0] == "contact" else []
+    labelled = [line for line in text.splitlines() if PHONE_LABEL_PATTERN.search(line) and line not in header]
+    return header + labelled
+
+
+def _is_phone(candidate, line):
+    """Return True if a PHONE_PATTERN match looks like a phone number rather than years, dates or an ID."""
+    if DATE_LIKE_PATTERN.match(candidate) or ID_NUMBER_PATTERN.match(candidate):
+        return False
+    if candidate.count("(") != candidate.count(")"):
+        return False
+    groups = re.findall(r'\d+', candidate)
+    if sum(1 for group in groups if YEAR_PATTERN.match(group)) >= 2:
+        return False
+    if ID_LABEL_PATTERN.search(line) and not PHONE_LABEL_PATTERN.search(line):
+        return False
+    return 10 <= len("".join(groups)) <= 13
+
+
+def _find_phone(text):
+    """Return the first plausible phone number of the contact lines."""
+    for line in _contact_lines(text):
+        for match in PHONE_PATTERN.finditer(line):
+            candidate = match.group(1).strip()
+            if _is_phone(candidate, line):
+                return candidate
+    return None
+
+
+def _find_skills(text):
+    """Return canonical skill names found in the text, in order of first mention."""
+    found = {}
+    for match in SKILLS_PATTERN.finditer(text):
+        spelling = match.group(1)
+        if spelling.lower() in _case_sensitive_lower and spelling not in CASE_SENSITIVE_SKILLS:
+            continue
+        found.setdefault(_skill_lookup[spelling.lower()], None)
+    return list(found)
+
+
+def pre_extract(resume_text):
+    """Extract fields that can be found deterministically in resume text.
+
+    Returns a dict holding whichever of "Email Id", "Contact No", "LinkedIn"
+    and "Skills" (comma-separated) were found, plus "skills_found", the
+    number of dictionary skills matched.
+    """
+    fields = {}
+
+    email_match = EMAIL_PATTERN.search(resume_text)
+    if email_match:
+        fields["Email Id"] = email_match.group(0)
+
+    phone = _find_phone(resume_text)
+    if phone:
+        fields["Contact No"] = phone
+
+    linkedin_match = LINKEDIN_PATTERN.search(resume_text)
+    if linkedin_match:
+        fields["LinkedIn"] = linkedin_match.group(0).rstrip('/')
+
+    skills = _find_skills(resume_text)
+    if skills:
+        fields["Skills"] = ", ".join(skills)
+    fields["skills_found"] = len(skills)
+    return fields
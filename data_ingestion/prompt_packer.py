@@ -0,0 +1,170 @@
+"""Section-aware packing of resume text into an LLM token budget.
+
+Token counts use tiktoken's cl100k_base encoding, not the tokenizer of the
+parse model (gemma2-9b-it), so they are an approximation; budgets are set
+with that margin in mind.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import logging
+from data_ingestion.config import TOKENIZER_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_ENCODING = "cl100k_base"
+TOKENIZER_BPE_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+# Estimate used when no tokenizer is available (matches the old app.estimate_tokens)
+CHARS_PER_TOKEN = 4.5
+TOKEN_SAFETY_FACTOR = 1.2
+
+SECTION_KEYWORDS = {
+    "summary": r"summary|profile|objective|about me|synopsis|career objective",
+    "experience": r"experience|employment|work history|career history|internships?",
+    "education": r"education|academics?|academic background|qualifications?",
+    "skills": r"skills|technical skills|technologies|tools|competencies|expertise|tech stack",
+    "projects": r"projects?",
+    "certifications": r"certifications?|certificates?|courses|trainings?|achievements|awards",
+}
+HEADING_PATTERNS = {
+    section: re.compile(rf"^(?:[a-z&/ ]{{0,25}}\s)?(?:{keywords})(?:\s[a-z&/ ]{{0,25}})?$")
+    for section, keywords in SECTION_KEYWORDS.items()
+}
+MAX_HEADING_WORDS = 5
+
+# Most informative sections first
+SECTION_PRIORITY = ["contact", "experience", "skills", "summary", "education", "certifications", "projects"]
+# No single section may take more than this share of the budget on the first pass
+SECTION_MAX_SHARE = 0.5
+
+
+def _get_encoding():
+    """Return the tiktoken encoding, loaded on first use from TOKENIZER_CACHE_DIR, or None.
+
+    tiktoken would otherwise download the BPE file (without a timeout) the
+    first time an encoding is requested, so the encoding is only loaded if
+    the file is already cached.
+    """
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+    with _encoding_lock:
+        if _encoding_loaded:
+            return _encoding
+        cache_file = os.path.join(TOKENIZER_CACHE_DIR, hashlib.sha1(TOKENIZER_BPE_URL.encode()).hexdigest())
+        try:
+            if not os.path.exists(cache_file):
+                raise FileNotFoundError(f"{TOKENIZER_ENCODING} is not cached in {TOKENIZER_CACHE_DIR}")
+            os.environ["TIKTOKEN_CACHE_DIR"] = TOKENIZER_CACHE_DIR
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:  # tiktoken missing, or its BPE file is not cached
+            logger.warning(f"tiktoken unavailable, falling back to estimated token counts: {e}")
+            _encoding = None
+        _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the tokenizer (approximate for the parse model), or estimate them if it is unavailable."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return int(int(len(text) / CHARS_PER_TOKEN) * TOKEN_SAFETY_FACTOR)
+
+
+def chars_for_tokens(max_tokens: int) -> int:
+    """Return the number of characters estimated to fit in max_tokens."""
+    return int(max_tokens * CHARS_PER_TOKEN / TOKEN_SAFETY_FACTOR)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:chars_for_tokens(max_tokens)]
+
+
+def _heading_section(line: str):
+    """Return the section a line introduces, or None if it is not a heading."""
+    candidate = line.strip().strip(":-–|•*#").strip().lower()
+    if not candidate or len(candidate.split()) > MAX_HEADING_WORDS:
+        return None
+    for section, pattern in HEADING_PATTERNS.items():
+        if pattern.match(candidate):
+            return section
+    return None
+
+
+def segment_resume(text: str):
+    """Split resume text into ordered (section, text) pairs.
+
+    Text before the first recognised heading is treated as the contact block.
+    """
+    sections = []
+    current_section = "contact"
+    current_lines = []
+    for line in text.splitlines():
+        section = _heading_section(line)
+        if section:
+            if any(l.strip() for l in current_lines):
+                sections.append((current_section, "\n".join(current_lines)))
+            current_section = section
+            current_lines = [line]
+        else:
+            current_lines.append(line)
+    if any(l.strip() for l in current_lines):
+        sections.append((current_section, "\n".join(current_lines)))
+    return sections
+
+
+def pack_resume_text(text: str, max_tokens: int) -> str:
+    """Fit resume text into max_tokens, keeping the most informative sections.
+
+    Sections are granted budget in SECTION_PRIORITY order, first capped at
+    SECTION_MAX_SHARE of the budget each, then topped up from whatever is
+    left. The packed sections keep their original order.
+    """
+    total_tokens = count_tokens(text)
+    if total_tokens <= max_tokens:
+        return text
+
+    sections = segment_resume(text)
+    section_tokens = [count_tokens(section_text) for _, section_text in sections]
+    order = sorted(range(len(sections)), key=lambda i: SECTION_PRIORITY.index(sections[i][0])
+                   if sections[i][0] in SECTION_PRIORITY else len(SECTION_PRIORITY))
+    allowed = [0] * len(sections)
+    remaining = max_tokens
+    share_cap = int(max_tokens * SECTION_MAX_SHARE)
+
+    for i in order:
+        grant = min(section_tokens[i], share_cap, remaining)
+        allowed[i] = grant
+        remaining -= grant
+    for i in order:
+        if remaining <= 0:
+            break
+        extra = min(section_tokens[i] - allowed[i], remaining)
+        allowed[i] += extra
+        remaining -= extra
+
+    packed = []
+    for (section, section_text), tokens, grant in zip(sections, section_tokens, allowed):
+        if grant >= tokens:
+            packed.append(section_text)
+        elif grant > 0:
+            packed.append(truncate_to_tokens(section_text, grant))
+    packed_text = "\n".join(packed)
+    logger.info(f"Packed resume from {total_tokens} to {count_tokens(packed_text)} tokens "
+                f"(sections: {', '.join(f'{s}={a}/{t}' for (s, _), t, a in zip(sections, section_tokens, allowed))})")
+    return packed_text
@@ -0,0 +1,138 @@
+"""Schema and incremental JSON parsing for structured resume parse responses."""
+
+import json
+from typing import Any, List, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+Scalar = Union[str, int, float]
+
+
+class ResumeFields(BaseModel):
+    """The flat set of fields parse_resume asks the model for."""
+
+    model_config = ConfigDict(extra="allow", populate_by_name=True)
+
+    name: Optional[str] = Field(None, alias="Name")
+    email_id: Optional[str] = Field(None, alias="Email Id")
+    contact_no: Optional[Scalar] = Field(None, alias="Contact No")
+    current_location: Optional[str] = Field(None, alias="Current Location")
+    total_experience: Optional[Scalar] = Field(None, alias="Total Experience")
+    designation: Optional[str] = Field(None, alias="Designation")
+    skills: Optional[Union[str, List[Any]]] = Field(None, alias="Skills")
+    ctc_info: Optional[Scalar] = Field(None, alias="CTC info")
+    companies_count: Optional[Scalar] = Field(None, alias="No of companies worked with till today")
+    last_company: Optional[str] = Field(None, alias="Last company worked with")
+    loyalty: Optional[Scalar] = Field(None, alias="Loyalty %")
+    category: Optional[str] = Field(None, alias="Category")
+
+    @field_validator("skills")
+    @classmethod
+    def _join_skills(cls, value):
+        """Accept a list of skills but store them comma-separated like the sheet expects."""
+        if isinstance(value, list):
+            return ", ".join(str(skill) for skill in value if skill not in (None, ""))
+        return value
+
+
+def validate_resume_fields(data):
+    """Validate a parsed object against ResumeFields and return it as a flat dict.
+
+    Keys the model returned are kept with their original names; unknown
+    extra keys pass through unchanged. Raises ValueError if data is not a
+    valid resume object.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+    try:
+        model = ResumeFields.model_validate(data)
+    except ValidationError as e:
+        raise ValueError(str(e)) from e
+    validated = model.model_dump(by_alias=True, exclude_unset=True)
+    return {key: validated.get(key, value) for key, value in data.items()}
+
+
+class IncrementalJSONParser:
+    """Parse a streamed JSON object and surface each top-level field as soon as its value completes.
+
+    String, object and array values are reported on their closing character,
+    true/false/null once spelled out and numbers at the next delimiter, so the
+    last field does not wait for the closing brace. Text before the opening
+    brace (for example a code fence) is ignored.
+    """
+
+    def __init__(self):
+        """Initialize an empty parser."""
+        self.fields = {}
+        self.done = False
+        self._buffer = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._value_start = None
+
+    def feed(self, chunk):
+        """Consume a chunk of text and return the (key, value) pairs it completed."""
+        completed = []
+        for char in chunk:
+            if self.done:
+                break
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._buffer.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._value_start is not None:
+                        completed.extend(self._flush())
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+
+            if self._depth == 0:
+                completed.extend(self._flush())
+                self.done = True
+            elif self._depth == 1 and char == ",":
+                completed.extend(self._flush())
+            elif self._depth == 1 and char == ":" and self._value_start is None:
+                self._buffer.append(char)
+                self._value_start = len(self._buffer)
+            else:
+                self._buffer.append(char)
+                if self._depth == 1 and self._value_start is not None and (char in "}]" or self._literal_complete(char)):
+                    completed.extend(self._flush())
+        return completed
+
+    def _literal_complete(self, char):
+        """Return True if a bare value (number, true, false, null) has just been completed."""
+        value = "".join(self._buffer[self._value_start:]).strip()
+        if char.isspace():
+            return bool(value)
+        return value in ("true", "false", "null")
+
+    def _flush(self):
+        """Parse the buffered `"key": value` member, if any."""
+        member = "".join(self._buffer).strip()
+        self._buffer = []
+        self._value_start = None
+        if not member:
+            return []
+        try:
+            parsed = json.loads("{" + member + "}")
+        except json.JSONDecodeError:
+            return []
+        self.fields.update(parsed)
+        return list(parsed.items())
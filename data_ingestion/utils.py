@@ -4,9 +4,13 @@ import os
 import json
 import re
 import pickle
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from data_ingestion.config import SAVE_DIR, LAST_CHECK_FILE
 
+_write_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="file-writer")
+
 def get_last_check_time():
     """Get the timestamp of the last email check."""
     if os.path.exists(LAST_CHECK_FILE):
@@ -106,4 +110,32 @@ def save_email_metadata(filename, metadata):
         with open(metadata_path, 'w') as f:
             json.dump(existing_metadata, f, indent=2)
     except Exception as e:
-        print(f"Error saving metadata: {e}")
\ No newline at end of file
+        print(f"Error saving metadata: {e}")
+
+def _write_file(file_path, file_content):
+    """Write bytes to a file, logging instead of raising on failure."""
+    try:
+        with open(file_path, "wb") as f:
+            f.write(file_content)
+        print(f"✅ Saved: {file_path}")
+    except Exception as e:
+        print(f"Error saving {file_path}: {e}")
+
+
+def _copy_file(source_path, file_path):
+    """Copy a file, logging instead of raising on failure."""
+    try:
+        shutil.copyfile(source_path, file_path)
+        print(f"✅ Saved: {file_path}")
+    except Exception as e:
+        print(f"Error saving {file_path}: {e}")
+
+
+def copy_file_async(source_path, file_path):
+    """Copy a file on disk in the background and return the pending future."""
+    return _write_executor.submit(_copy_file, source_path, file_path)
+
+
+def write_file_async(file_path, file_content):
+    """Persist bytes to disk in the background and return the pending future."""
+    return _write_executor.submit(_write_file, file_path, file_content)
@@ -2,8 +2,97 @@
 
 import os
 import json
-from groq import Groq
-from data_ingestion.config import API_KEYS
+import asyncio
+import weakref
+import threading
+from collections import deque
+from groq import Groq, AsyncGroq, BadRequestError
+from data_ingestion.config import API_KEYS, GROQ_REQUESTS_PER_KEY
+
+COUNTS_FILE = 'grok_work/api_request_counts.json'
+
+
+class _SlotLimiter:
+    """Process-wide limit on concurrent requests that event loops in any thread can wait on.
+
+    A released slot is handed straight to the longest waiting request, on
+    that request's own loop, so nothing polls and a cancelled wait never
+    leaks a slot.
+    """
+
+    def __init__(self, limit):
+        """Allow limit slots to be held at once."""
+        self._lock = threading.Lock()
+        self._free = limit
+        self._waiters = deque()
+
+    async def acquire(self):
+        """Wait until a slot is free and take it."""
+        with self._lock:
+            if self._free and not self._waiters:
+                self._free -= 1
+                return
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            # A slot handed over before the cancellation is passed on;
+            # one still on its way is passed on by _grant
+            if not queued and waiter[1].done() and not waiter[1].cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        """Give a slot back, handing it to the next waiting request if there is one."""
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._grant, future)
+                    return
+                except RuntimeError:
+                    # That request's loop is closed
+                    continue
+            self._free += 1
+
+    def _grant(self, future):
+        """Hand a slot to future on its loop, or pass it on if the wait was cancelled meanwhile."""
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
+
+
+class _SlotStream:
+    """Async stream wrapper that releases its request slot once the stream ends or is closed."""
+
+    def __init__(self, stream, slots):
+        """Wrap stream, which currently holds one of slots."""
+        self._stream = stream
+        self._slots = slots
+        self._released = False
+
+    async def __aiter__(self):
+        """Yield the stream's chunks, releasing the slot at the end."""
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        finally:
+            await self.close()
+
+    async def close(self):
+        """Close the underlying stream and release the slot."""
+        if not self._released:
+            self._released = True
+            self._slots.release()
+            await self._stream.close()
+
 
 class SequentialGroqClient:
     """A client that rotates through multiple Groq API keys."""
@@ -14,25 +103,42 @@ class SequentialGroqClient:
         self.current_key_index = 0
         self.request_counts = {key: 0 for key in api_keys}
         self.max_requests_per_key = 1000
+        self.max_concurrency = len(set(api_keys)) * GROQ_REQUESTS_PER_KEY
+        # Shared by every thread and event loop (Flask requests, sweeps) of the process
+        self._slots = _SlotLimiter(self.max_concurrency)
+        self._key_lock = threading.Lock()
+        self._counts_lock = threading.Lock()
+        # AsyncGroq clients are bound to their event loop, so one per key is kept per loop
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._next_async_key = 0
         self.load_counts()
 
     def load_counts(self):
         """Load request counts from file if available."""
         try:
-            if os.path.exists('grok_work/api_request_counts.json'):
-                with open('grok_work/api_request_counts.json', 'r') as f:
+            if os.path.exists(COUNTS_FILE):
+                with open(COUNTS_FILE, 'r') as f:
                     self.request_counts = json.load(f)
         except Exception as e:
             print(f"Error loading request counts: {e}")
 
     def save_counts(self):
-        """Save request counts to file."""
+        """Save request counts to file, replacing it atomically."""
         try:
-            with open('grok_work/api_request_counts.json', 'w') as f:
-                json.dump(self.request_counts, f)
+            with self._counts_lock:
+                tmp_path = f"{COUNTS_FILE}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(self.request_counts, f)
+                os.replace(tmp_path, COUNTS_FILE)
         except Exception as e:
             print(f"Error saving request counts: {e}")
 
+    def _count_request(self, key):
+        """Record one request made with key and save the counts."""
+        with self._counts_lock:
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+        self.save_counts()
+
     def get_current_key(self):
         """Return the current API key."""
         return self.api_keys[self.current_key_index]
@@ -51,8 +157,12 @@ class SequentialGroqClient:
             if all(self.request_counts[key] >= self.max_requests_per_key for key in self.api_keys):
                 print("WARNING: All API keys have reached their daily limits!")
 
-    def make_request(self, model, messages, temperature=0, max_completion_tokens=6790, top_p=0.95, stream=True):
-        """Make a request to the Groq API with key rotation."""
+    def make_request(self, model, messages, temperature=0, max_completion_tokens=6790, top_p=0.95, stream=True, **kwargs):
+        """Make a request to the Groq API with key rotation.
+
+        Extra keyword arguments (e.g. response_format) are passed through to the API.
+        Bad requests are raised rather than retried, since another key will not fix them.
+        """
         self.move_to_next_key_if_needed()
         current_key = self.get_current_key()
         client = self.get_current_client()
@@ -64,15 +174,76 @@ class SequentialGroqClient:
                 temperature=temperature,
                 max_completion_tokens=max_completion_tokens,
                 top_p=top_p,
-                stream=stream
+                stream=stream,
+                **kwargs
             )
-            self.request_counts[current_key] += 1
-            self.save_counts()
+            self._count_request(current_key)
             return completion
+        except BadRequestError:
+            raise
         except Exception as e:
             print(f"Error with API key #{self.current_key_index + 1}: {e}")
             self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-            return self.make_request(model, messages, temperature, max_completion_tokens, top_p, stream)
+            return self.make_request(model, messages, temperature, max_completion_tokens, top_p, stream, **kwargs)
+
+    def _get_async_client(self, key):
+        """Return the AsyncGroq client for key on the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        with self._key_lock:
+            clients = self._async_clients.setdefault(loop, {})
+            if key not in clients:
+                clients[key] = AsyncGroq(api_key=key)
+            return clients[key]
+
+    def _pick_async_key(self):
+        """Return the next key under its daily limit, round-robin over distinct keys."""
+        keys = list(dict.fromkeys(self.api_keys))
+        with self._key_lock:
+            for _ in range(len(keys)):
+                key = keys[self._next_async_key % len(keys)]
+                self._next_async_key += 1
+                if self.request_counts.get(key, 0) < self.max_requests_per_key:
+                    return key
+        print("WARNING: All API keys have reached their daily limits!")
+        return keys[self._next_async_key % len(keys)]
+
+    async def make_request_async(self, model, messages, temperature=0, max_completion_tokens=6790, top_p=0.95, stream=True, **kwargs):
+        """Make a request with the async Groq client, spreading concurrent calls over the keys.
+
+        At most max_concurrency requests run at once across the whole process;
+        a streamed response keeps its slot until it is exhausted or closed.
+        Failed requests are retried once on each other key before the error
+        is raised.
+        """
+        last_error = None
+        for _ in range(len(set(self.api_keys))):
+            key = self._pick_async_key()
+            await self._slots.acquire()
+            try:
+                client = self._get_async_client(key)
+                completion = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_completion_tokens=max_completion_tokens,
+                    top_p=top_p,
+                    stream=stream,
+                    **kwargs
+                )
+            except BaseException as e:
+                # Also on cancellation, so the process-wide slot is never lost
+                self._slots.release()
+                if isinstance(e, BadRequestError) or not isinstance(e, Exception):
+                    raise
+                print(f"Error with API key #{self.api_keys.index(key) + 1}: {e}")
+                last_error = e
+                continue
+            self._count_request(key)
+            if stream:
+                return _SlotStream(completion, self._slots)
+            self._slots.release()
+            return completion
+        raise last_error
 
 
-client = SequentialGroqClient(API_KEYS)
\ No newline at end of file
+client = SequentialGroqClient(API_KEYS)
@@ -1,14 +1,25 @@
 """Entry point for the resume processing script."""
 
+import argparse
 import time
-from data_ingestion.email_fetcher import fetch_resumes_from_email
+from data_ingestion.email_fetcher import fetch_resumes_from_email, run_ingestion_daemon
 
 def main():
     """Run the resume processing workflow."""
+    parser = argparse.ArgumentParser(description="Fetch resumes from email and process them.")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and process new emails as they arrive (IMAP IDLE)")
+    args = parser.parse_args()
+
+    if args.daemon:
+        print(f"Starting resume ingestion daemon at {time.ctime()}...")
+        run_ingestion_daemon()
+        return
+
     print(f"Starting resume processing at {time.ctime()}...")
     print("Will check emails, process each resume immediately, and update Excel file")
     new_files = fetch_resumes_from_email()
     print(f"Total new resumes fetch_resumes_from_emailprocessed: {new_files}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()